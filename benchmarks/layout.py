@@ -0,0 +1,64 @@
+"""
+Measures how the layouts scale with the number of children.
+
+Run from the repository root:
+> python -m benchmarks.layout
+
+For every container, the time for a full measure and arrange pass is
+printed for growing numbers of children. The time per child should
+stay roughly constant.
+"""
+
+import time
+
+from cac.client.engine.layout import Place, Flex, Horizontal, Vertical, \
+    Grid
+
+
+def make_children(n):
+    return [Place(lambda x, y, w, h: None, min_width=3, min_height=2)
+            for i in range(n)]
+
+
+def time_full_pass(layout, leaves, number):
+    """
+    Returns the average time of a measure and arrange pass
+    over the complete layout tree.
+    """
+    total = 0
+    for i in range(number):
+        # invalidating every leaf throws away all cached results in the tree
+        for leaf in leaves:
+            leaf.invalidate()
+        start = time.perf_counter()
+        layout.apply(0, 0, 10000, 10000)
+        total += time.perf_counter() - start
+    return total / number
+
+
+def main():
+    containers = [
+        ("Vertical", lambda children: Vertical(0, *children)),
+        ("Horizontal", lambda children: Horizontal(0, *children)),
+        ("Flex", lambda children: Flex(
+            *children, weights=[i % 3 for i in range(len(children))])),
+        ("Grid", lambda children: Grid(20, *children)),
+        ("Nested", lambda children: Vertical(0, *[
+            Horizontal(0, *children[i:i + 10])
+            for i in range(0, len(children), 10)])),
+    ]
+    sizes = [10, 100, 1000, 10000]
+
+    print(f"{'layout':<12}{'children':>10}{'pass [ms]':>12}"
+          f"{'per child [us]':>16}")
+    for name, make_layout in containers:
+        for n in sizes:
+            leaves = make_children(n)
+            layout = make_layout(leaves)
+            seconds = time_full_pass(layout, leaves, max(3, 10000 // n))
+            print(f"{name:<12}{n:>10}{seconds * 1e3:>12.3f}"
+                  f"{seconds / n * 1e6:>16.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+Puts load on a server with many bots.
+
+Run from the repository root:
+> python -m benchmarks.load_test --bots 200 --rooms 20 --duration 10
+
+The bots connect over localhost, join the rooms, play cards and vote
+(see cac.client.bot). By default, the server is started as a separate
+process (`--server subprocess`, with `--workers` worker processes),
+so that the bots and the server do not share a CPU. With
+`--server inprocess`, the server runs on a thread of this process.
+Use `--port` to test a server, that is already running
+(its CPU time is not reported then).
+
+Reported are the round trip latencies (Ping -> Pong and
+PlayCard -> delta containing the card) as percentiles, the number of
+messages per second and the CPU time, that the server used.
+"""
+
+import argparse
+import asyncio
+import os
+import resource
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from cac.client.bot import Bot
+from cac.server.game_server import GameServer
+
+
+def percentile(values, p):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def get_free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(.1)
+    raise RuntimeError(f"The server did not start listening on {port}.")
+
+
+class SubprocessServer:
+    """
+    Runs `python -m cac.server.server` (without announcement).
+    """
+
+    def __init__(self, port, workers):
+        env = dict(os.environ,
+                   CAC_PORT=str(port),
+                   CAC_LISTEN_ADDRESS="127.0.0.1",
+                   CAC_ANNOUNCE="0",
+                   CAC_WORKERS=str(workers),
+                   CAC_MAX_PLAYERS="1000000")
+        self._cpu_before = _children_cpu_time()
+        self._process = subprocess.Popen(
+            [sys.executable, "-m", "cac.server.server"], env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        wait_for_port(port)
+
+    def stop(self):
+        """
+        Stops the server and returns the CPU time, it used.
+        """
+        self._process.terminate()
+        self._process.wait()
+        # includes the worker processes, as the server waited for them
+        return _children_cpu_time() - self._cpu_before
+
+
+def _children_cpu_time():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+class ThreadServer:
+    """
+    Runs a GameServer on its own event loop on a thread of this process.
+    """
+
+    def __init__(self, port):
+        self._server = GameServer("127.0.0.1", port, max_connections=10 ** 6)
+        self._started = threading.Event()
+        self._cpu_time = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._started.wait()
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+
+        async def serve():
+            self._stop_event = asyncio.Event()
+            await self._server.start()
+            self._started.set()
+            start = time.thread_time()
+            try:
+                await self._stop_event.wait()
+            finally:
+                self._cpu_time = time.thread_time() - start
+                await self._server.stop()
+
+        self._loop.run_until_complete(serve())
+        self._loop.close()
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._stop_event.set)
+        self._thread.join()
+        return self._cpu_time
+
+
+async def run_bots(args, port):
+    bots = [Bot(f"Bot {i}", f"Room {i % args.rooms}",
+                play_rate=args.play_rate, vote_rate=args.vote_rate,
+                ping_rate=args.ping_rate, seed=i)
+            for i in range(args.bots)]
+
+    # connect in small batches, not to overflow the listen backlog
+    start = time.perf_counter()
+    for i in range(0, len(bots), 50):
+        await asyncio.gather(*[bot.connect("127.0.0.1", port)
+                               for bot in bots[i:i + 50]])
+    connect_time = time.perf_counter() - start
+
+    # play
+    sent_before = sum(bot.connection.messages_sent for bot in bots)
+    received_before = sum(bot.connection.messages_received for bot in bots)
+    start = time.perf_counter()
+    await asyncio.gather(*[bot.run(args.duration) for bot in bots])
+    duration = time.perf_counter() - start
+    sent = sum(bot.connection.messages_sent for bot in bots) - sent_before
+    received = sum(bot.connection.messages_received
+                   for bot in bots) - received_before
+
+    for bot in bots:
+        bot.close()
+    return bots, connect_time, duration, sent, received
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--bots", type=int, default=100)
+    parser.add_argument("--rooms", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=10,
+                        help="seconds of playing")
+    parser.add_argument("--play-rate", type=float, default=1,
+                        help="cards played per bot and second")
+    parser.add_argument("--vote-rate", type=float, default=.5,
+                        help="votes per czar and second")
+    parser.add_argument("--ping-rate", type=float, default=1,
+                        help="pings per bot and second")
+    parser.add_argument("--server", choices=["subprocess", "inprocess"],
+                        default="subprocess")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="worker processes of a subprocess server")
+    parser.add_argument("--port", type=int, default=None,
+                        help="use an already running server on this port")
+    args = parser.parse_args()
+
+    # start the server
+    server = None
+    port = args.port
+    if port is None:
+        port = get_free_port()
+        if args.server == "subprocess":
+            server = SubprocessServer(port, args.workers)
+        else:
+            server = ThreadServer(port)
+
+    try:
+        bots, connect_time, duration, sent, received = \
+            asyncio.run(run_bots(args, port))
+    finally:
+        server_cpu = server.stop() if server is not None else None
+
+    # report
+    print(f"{args.bots} bots in {args.rooms} rooms, "
+          f"connected in {connect_time:.2f} s, "
+          f"played for {duration:.2f} s")
+    print()
+    print(f"{'latency [ms]':<16}{'samples':>10}{'p50':>10}{'p95':>10}"
+          f"{'p99':>10}")
+    for name, latencies in [
+            ("ping", [lat for bot in bots for lat in bot.ping_latencies]),
+            ("play card", [lat for bot in bots
+                           for lat in bot.play_latencies])]:
+        print(f"{name:<16}{len(latencies):>10}"
+              f"{percentile(latencies, 50) * 1e3:>10.2f}"
+              f"{percentile(latencies, 95) * 1e3:>10.2f}"
+              f"{percentile(latencies, 99) * 1e3:>10.2f}")
+    print()
+    print(f"messages sent by the bots:     {sent / duration:>10.0f} / s")
+    print(f"messages received by the bots: {received / duration:>10.0f} / s")
+    if server_cpu is not None:
+        # (including the start of the server and connecting the bots)
+        print(f"server cpu time:               {server_cpu:>10.2f} s "
+              f"({server_cpu / duration * 100:.0f}% of one core)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Compares the binary wire protocol with sending the room state as JSON.
+
+Run from the repository root:
+> python -m benchmarks.protocol
+
+For rooms of growing size, the encode and decode throughput and the
+bytes on the wire are printed for
+ - a full snapshot of the room, and
+ - a typical tick: some cards are played and one score changes,
+   sent as binary RoomDelta vs. the naive approach of sending the
+   complete state as JSON after every change.
+"""
+
+import json
+import random
+import time
+
+from cac.protocol import wire
+from cac.protocol.room_state import RoomState
+
+
+def make_room(players):
+    state = RoomState("benchmark")
+    for player in range(1, players + 1):
+        state.add_player(player, f"Player {player}")
+    state.set_czar(1)
+    state.new_round(random.randrange(1000))
+    for player in range(2, players + 1, 2):
+        state.play_card(player, random.randrange(100000))
+    state.take_delta()
+    return state
+
+
+def make_tick(state):
+    players = list(state.players)
+    for player in random.sample(players, min(5, len(players))):
+        state.play_card(player, random.randrange(100000))
+    winner = random.choice(players)
+    state.set_score(winner, state.players[winner][1] + 1)
+
+
+def state_to_json(state):
+    return json.dumps({
+        "room": state.room,
+        "sequence": state.sequence,
+        "round": state.round,
+        "czar": state.czar,
+        "black_card": state.black_card,
+        "players": [{"id": player, "name": name, "score": score}
+                    for player, (name, score) in state.players.items()],
+        "played": [{"player": player, "card": card}
+                   for player, card in state.played.items()],
+    }).encode("utf-8")
+
+
+def measure(function, number):
+    start = time.perf_counter()
+    for i in range(number):
+        result = function()
+    return (time.perf_counter() - start) / number, result
+
+
+def print_row(name, players, encode_seconds, decode_seconds, size):
+    print(f"{name:<16}{players:>8}{1 / encode_seconds:>14.0f}"
+          f"{1 / decode_seconds:>14.0f}{size:>12}")
+
+
+def main():
+    random.seed(0)
+    print(f"{'message':<16}{'players':>8}{'encode [1/s]':>14}"
+          f"{'decode [1/s]':>14}{'bytes':>12}")
+    for players in [10, 100, 1000, 10000]:
+        number = max(10, 100000 // players)
+        state = make_room(players)
+
+        # full snapshot
+        snapshot = state.snapshot()
+        encode, frame = measure(lambda: wire.encode(snapshot), number)
+        decode, _ = measure(lambda: wire.decode(frame), number)
+        print_row("binary snapshot", players, encode, decode, len(frame))
+
+        encode, data = measure(lambda: state_to_json(state), number)
+        decode, _ = measure(lambda: json.loads(data), number)
+        print_row("json snapshot", players, encode, decode, len(data))
+
+        # a single tick
+        make_tick(state)
+        delta = state.take_delta()
+        encode, frame = measure(lambda: wire.encode(delta), number * 10)
+        decode, _ = measure(lambda: wire.decode(frame), number * 10)
+        print_row("binary delta", players, encode, decode, len(frame))
+
+        encode, data = measure(lambda: state_to_json(state), number)
+        decode, _ = measure(lambda: json.loads(data), number)
+        print_row("json full state", players, encode, decode, len(data))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Decks of cards for the game rooms.
+
+The cards themselves are stored once, in a CardTable, which never
+changes and is shared by all rooms. A room only holds a Deck: the draw
+pile and the discard pile as arrays of indices into the table (uint16
+for tables with up to 65536 cards), so a room needs a few bytes per
+card, no matter how long the texts are.
+"""
+
+import numpy as np
+
+
+class CardTable:
+    """
+    An immutable list of cards.
+     - `texts` are the texts of the cards. The blanks are marked
+       by underscores (e.g. "_ + _ = _").
+     - `picks` is the number of white cards, that have to be played
+       on a black card (0 for white cards).
+    """
+
+    def __init__(self, texts, picks=None):
+        self._texts = tuple(texts)
+        if picks is None:
+            picks = np.zeros(len(self._texts), dtype=np.uint8)
+        self.picks = np.array(picks, dtype=np.uint8)
+        self.picks.setflags(write=False)
+
+    def __len__(self):
+        return len(self._texts)
+
+    def __getitem__(self, index):
+        return self._texts[index]
+
+
+def get_index_dtype(size):
+    """
+    The smallest unsigned integer type, that can index `size` cards.
+    """
+    return np.uint16 if size <= 1 << 16 else np.uint32
+
+
+class Deck:
+    """
+    The draw pile and the discard pile of a room, for a table of `size`
+    cards. Initially, all cards are on the draw pile, in random order.
+
+    Drawing a card is O(1): the top of the pile is the end of the
+    array. Reshuffling the discarded cards back into the pile is a
+    single vectorised copy and shuffle.
+
+    Cards, that are neither on the draw pile nor discarded, are in the
+    hands of the players or on the table.
+    """
+
+    def __init__(self, size, rng=None):
+        self.size = size
+        self._rng = rng if rng is not None else np.random.default_rng()
+        dtype = get_index_dtype(size)
+
+        # the draw pile is self._pile[:self._remaining],
+        # the discard pile is self._discard[:self._discarded]
+        self._pile = self._rng.permutation(size).astype(dtype)
+        self._remaining = size
+        self._discard = np.empty(size, dtype=dtype)
+        self._discarded = 0
+
+    @property
+    def remaining(self):
+        """
+        The number of cards on the draw pile.
+        """
+        return self._remaining
+
+    @property
+    def discarded(self):
+        """
+        The number of cards on the discard pile.
+        """
+        return self._discarded
+
+    @property
+    def nbytes(self):
+        return self._pile.nbytes + self._discard.nbytes
+
+    def draw(self):
+        """
+        Draws a single card. If the draw pile is empty, the discarded
+        cards are reshuffled first. Returns None, if there are no cards
+        left at all.
+        """
+        if self._remaining == 0:
+            self.reshuffle()
+            if self._remaining == 0:
+                return None
+        self._remaining -= 1
+        return int(self._pile[self._remaining])
+
+    def draw_many(self, count):
+        """
+        Draws up to `count` cards at once (e.g. to deal a hand).
+        Returns them as array.
+        """
+        if count > self._remaining:
+            self.reshuffle()
+        count = min(count, self._remaining)
+        start = self._remaining - count
+        cards = self._pile[start:self._remaining][::-1].copy()
+        self._remaining = start
+        return cards
+
+    def discard(self, card):
+        self._discard[self._discarded] = card
+        self._discarded += 1
+
+    def discard_many(self, cards):
+        cards = np.asarray(cards)
+        end = self._discarded + len(cards)
+        self._discard[self._discarded:end] = cards
+        self._discarded = end
+
+    def reshuffle(self):
+        """
+        Puts the discarded cards back into the draw pile and shuffles it.
+        """
+        if self._discarded == 0:
+            return
+        end = self._remaining + self._discarded
+        self._pile[self._remaining:end] = self._discard[:self._discarded]
+        self._discarded = 0
+        self._remaining = end
+        self._rng.shuffle(self._pile[:end])
@@ -0,0 +1,290 @@
+"""
+Imports community decks into a card store (see cac.cards.store).
+
+Usage:
+> python -m cac.cards.importer decks.json more_decks.csv -o cards.cards
+
+Supported inputs:
+ - JSON: an array of cards. A card is either a string (a white card)
+   or an object with "text" and optionally "pick" (number of white
+   cards to play, 0 or missing for white cards), "black" (true for
+   black cards, if there is no "pick") and "deck" (name of the deck).
+ - CSV: a header row with the columns "text" and optionally "pick"
+   and "deck".
+Cards without a deck belong to a deck named after the input file.
+
+The inputs are parsed as a stream, so only small parts of them are in
+memory at any time. The cards are normalised (whitespace, unicode and
+blanks) and validated in batches on a pool of processes. Duplicates
+(the same normalised text and colour) are dropped: only a 64 bit hash
+of each card is remembered for that, so memory use grows with the
+number of unique cards (roughly 60 to 90 bytes each for the int and
+its set entry), but not with the length of their texts.
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+import unicodedata
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+from cac.cards.store import CardStoreWriter, CardStoreError
+
+# cards longer than this (in characters) are rejected
+MAX_TEXT_LENGTH = 500
+# at most this many cards have to be played on a black card
+MAX_PICK = 3
+
+_READ_SIZE = 64 * 1024
+# json values larger than this are considered an error
+_MAX_JSON_VALUE_SIZE = 1024 * 1024
+
+_WHITESPACE = re.compile(r"\s+")
+_BLANK = re.compile(r"_+")
+
+
+class InputError(Exception):
+    """
+    An input file can not be parsed.
+    """
+    pass
+
+
+def iter_json_cards(f):
+    """
+    Yields the elements of the JSON array in the given text file,
+    without reading the whole file.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    eof = False
+    started = False
+
+    while True:
+        # skip separators
+        while position < len(buffer) and \
+                (buffer[position].isspace() or
+                 (started and buffer[position] == ",")):
+            position += 1
+        if position < len(buffer):
+            if not started:
+                if buffer[position] != "[":
+                    raise InputError("Expected a JSON array.")
+                started = True
+                position += 1
+                continue
+            if buffer[position] == "]":
+                return
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except ValueError as e:
+                # maybe the value is not complete, yet
+                if eof or len(buffer) - position > _MAX_JSON_VALUE_SIZE:
+                    raise InputError(f"Invalid JSON: {e}")
+            else:
+                # a number at the end of the buffer might continue
+                if end < len(buffer) or eof:
+                    yield value
+                    position = end
+                    continue
+        elif eof:
+            raise InputError("Unexpected end of the JSON array.")
+
+        # read more and drop what was consumed
+        chunk = f.read(_READ_SIZE)
+        eof = chunk == ""
+        buffer = buffer[position:] + chunk
+        position = 0
+
+
+def iter_csv_cards(f):
+    reader = csv.DictReader(f)
+    if reader.fieldnames is None or "text" not in reader.fieldnames:
+        raise InputError("The CSV file needs a 'text' column.")
+    for row in reader:
+        yield row
+
+
+def iter_cards(path):
+    """
+    Yields the raw cards of an input file as tuples of
+    (text, pick, is black, deck name).
+    """
+    default_deck = os.path.splitext(os.path.basename(path))[0]
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        if path.lower().endswith(".csv"):
+            for row in iter_csv_cards(f):
+                pick = _parse_pick(row.get("pick"))
+                yield (row["text"], pick, bool(pick),
+                       row.get("deck") or default_deck)
+        else:
+            for value in iter_json_cards(f):
+                if isinstance(value, str):
+                    yield value, 0, False, default_deck
+                elif isinstance(value, dict):
+                    pick = _parse_pick(value.get("pick"))
+                    yield (value.get("text"), pick,
+                           bool(pick) or bool(value.get("black")),
+                           value.get("deck") or default_deck)
+                else:
+                    yield None, 0, False, default_deck
+
+
+def _parse_pick(value):
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        return -1
+
+
+def normalise_text(text):
+    """
+    Normalises unicode and whitespace and makes all blanks
+    a single underscore.
+    """
+    text = unicodedata.normalize("NFC", text)
+    text = _WHITESPACE.sub(" ", text).strip()
+    return _BLANK.sub("_", text)
+
+
+def validate_batch(cards):
+    """
+    Normalises and validates a batch of raw cards.
+    Runs in the worker processes.
+    Returns the valid cards as (text, pick, deck name) tuples
+    and a Counter with the reasons for the invalid ones.
+    """
+    valid = []
+    rejected = Counter()
+    for text, pick, black, deck in cards:
+        if not isinstance(text, str) or not isinstance(deck, str):
+            rejected["malformed"] += 1
+            continue
+        text = normalise_text(text)
+        if not text:
+            rejected["empty"] += 1
+            continue
+        if len(text) > MAX_TEXT_LENGTH:
+            rejected["too long"] += 1
+            continue
+        blanks = text.count("_")
+        if black:
+            # questions without blanks are fine,
+            # but the number of blanks has to match otherwise
+            if pick == 0:
+                pick = max(1, blanks)
+            if not 1 <= pick <= MAX_PICK or (blanks and blanks != pick):
+                rejected["wrong number of blanks"] += 1
+                continue
+        elif pick != 0 or blanks:
+            rejected["blanks on a white card"] += 1
+            continue
+        valid.append((text, pick, normalise_text(deck)))
+    return valid, rejected
+
+
+def _card_hash(text, pick):
+    # 8 bytes are enough to tell apart billions of cards
+    key = f"{bool(pick)}:{text.casefold()}".encode("utf-8")
+    return int.from_bytes(
+        hashlib.blake2b(key, digest_size=8).digest(), "little")
+
+
+def _batches(paths, batch_size, stats):
+    for path in paths:
+        batch = []
+        for card in iter_cards(path):
+            stats["read"] += 1
+            batch.append(card)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+def import_cards(paths, output, workers=None, batch_size=2000):
+    """
+    Imports the cards of the given files into a new card store.
+    Returns a Counter with the statistics of the import.
+    """
+    stats = Counter()
+    seen = set()
+    deck_ids = dict()
+    workers = workers or os.cpu_count() or 1
+
+    with CardStoreWriter(output) as writer, \
+            ProcessPoolExecutor(max_workers=workers) as pool:
+
+        def write(result):
+            valid, rejected = result
+            stats.update({f"rejected: {reason}": count
+                          for reason, count in rejected.items()})
+            for text, pick, deck in valid:
+                card_hash = _card_hash(text, pick)
+                if card_hash in seen:
+                    stats["duplicates"] += 1
+                    continue
+                seen.add(card_hash)
+                deck_id = deck_ids.get(deck)
+                if deck_id is None:
+                    deck_id = deck_ids[deck] = writer.add_deck(deck)
+                writer.add(text, pick, deck_id)
+                stats["imported"] += 1
+
+        # only a few batches are in flight at any time, so that the
+        # memory use does not depend on the size of the input.
+        # the results are written in order.
+        pending = deque()
+        for batch in _batches(paths, batch_size, stats):
+            pending.append(pool.submit(validate_batch, batch))
+            if len(pending) >= 2 * workers:
+                write(pending.popleft().result())
+        while pending:
+            write(pending.popleft().result())
+
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Imports decks (JSON or CSV) into a card store.")
+    parser.add_argument("inputs", nargs="+", help="JSON or CSV files")
+    parser.add_argument("-o", "--output", required=True,
+                        help="the card store to write")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of validation processes")
+    parser.add_argument("--batch-size", type=int, default=2000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    try:
+        stats = import_cards(args.inputs, args.output,
+                             args.workers, args.batch_size)
+    except (InputError, CardStoreError, OSError) as e:
+        print(f"Import failed: {e}", file=sys.stderr)
+        sys.exit(1)
+    except OverflowError:
+        # the deck ids are stored as 16 bit numbers
+        print("Import failed: too many decks (at most 65536).",
+              file=sys.stderr)
+        sys.exit(1)
+    seconds = time.perf_counter() - start
+
+    print(f"Read {stats['read']} cards, imported {stats['imported']} "
+          f"into {args.output}.")
+    for key, count in sorted(stats.items()):
+        if key not in ("read", "imported"):
+            print(f"  {key}: {count}")
+    print(f"{seconds:.2f} s, {stats['read'] / seconds:.0f} cards/s")
+
+
+if __name__ == "__main__":
+    main()
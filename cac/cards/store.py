@@ -0,0 +1,265 @@
+"""
+A compact file format for large decks of cards, that is memory-mapped
+instead of being read.
+
+Loading a card store only maps the file and parses the header, so it
+takes the same (short) time for any number of cards. Processes, that
+map the same file, share its pages (e.g. the worker processes of the
+server).
+
+Layout (all numbers little endian, sections aligned to 8 bytes):
+
+    header      magic "CACS", format version, number of cards,
+                number of decks and the offsets of the sections
+    offsets     uint32 per card: start of its text in the blob
+    lengths     uint32 per card: length of its text in bytes
+    picks       uint8 per card: the number of white cards, that have
+                to be played on a black card (0 for white cards)
+    deck ids    uint16 per card: the deck, that the card belongs to
+    deck names  utf-8, separated by zero bytes
+    blob        the texts of all cards, utf-8
+"""
+
+import array
+import mmap
+import os
+import shutil
+import struct
+import sys
+import tempfile
+
+import numpy as np
+
+MAGIC = b"CACS"
+FORMAT_VERSION = 1
+
+_HEADER = struct.Struct("<4sHHII7Q")
+
+# maximum number of bytes in the blob (the offsets are uint32)
+MAX_BLOB_SIZE = (1 << 32) - 1
+
+
+class CardStoreError(Exception):
+    """
+    The file is not a (valid) card store.
+    """
+    pass
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+class CardStoreWriter:
+    """
+    Writes a card store card by card.
+
+    The texts are written to a temporary file right away, only the
+    fixed width fields (12 bytes per card) are kept in memory. Use it as
+    context manager: the card store is written on a successful exit.
+    The file is replaced atomically, so that processes, that have the
+    old file mapped, are not affected.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.deck_names = []
+        self._offsets = array.array("I")
+        self._lengths = array.array("I")
+        self._picks = array.array("B")
+        self._deck_ids = array.array("H")
+        self._directory = os.path.dirname(os.path.abspath(path))
+        self._blob = tempfile.TemporaryFile(dir=self._directory)
+        self._blob_size = 0
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def add_deck(self, name):
+        """
+        Adds a deck and returns its id.
+        """
+        self.deck_names.append(name.replace("\0", ""))
+        return len(self.deck_names) - 1
+
+    def add(self, text, pick=0, deck_id=0):
+        """
+        Adds a card and returns its index.
+        """
+        data = text.encode("utf-8")
+        if self._blob_size + len(data) > MAX_BLOB_SIZE:
+            raise CardStoreError("Too much text for a single card store.")
+        self._offsets.append(self._blob_size)
+        self._lengths.append(len(data))
+        self._picks.append(pick)
+        self._deck_ids.append(deck_id)
+        self._blob.write(data)
+        self._blob_size += len(data)
+        return len(self._offsets) - 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                self._write()
+        finally:
+            self._blob.close()
+
+    def _write(self):
+        arrays = [self._offsets, self._lengths, self._picks, self._deck_ids]
+        if sys.byteorder == "big":
+            for values in arrays:
+                values.byteswap()
+        deck_names = "\0".join(self.deck_names).encode("utf-8")
+        sections = [values.tobytes() for values in arrays] + [deck_names]
+
+        # where the sections go
+        section_offsets = []
+        position = _align(_HEADER.size)
+        for section in sections:
+            section_offsets.append(position)
+            position = _align(position + len(section))
+        header = _HEADER.pack(
+            MAGIC, FORMAT_VERSION, 0, len(self), len(self.deck_names),
+            *section_offsets, len(deck_names), self._blob_size)
+
+        fd, tmp_path = tempfile.mkstemp(dir=self._directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(header)
+                for offset, section in zip(section_offsets, sections):
+                    f.write(bytes(offset - f.tell()))
+                    f.write(section)
+                f.write(bytes(position - f.tell()))
+                self._blob.seek(0)
+                shutil.copyfileobj(self._blob, f, 1024 * 1024)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+def write_card_store(path, cards, deck_names=()):
+    """
+    Writes a card store.
+    :param cards: iterable of (text, pick, deck id) tuples
+    :param deck_names: the names of the decks, indexed by the deck ids
+    """
+    with CardStoreWriter(path) as writer:
+        for name in deck_names:
+            writer.add_deck(name)
+        for text, pick, deck_id in cards:
+            writer.add(text, pick, deck_id)
+
+
+class CardStore:
+    """
+    A memory-mapped card store.
+
+    Can be used like a CardTable (see cac.cards.deck): the card with
+    a given index is store[index], the pick counts are in `picks`.
+    `offsets`, `lengths` and `deck_ids` are read-only arrays, that
+    live in the mapped file as well.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            try:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise CardStoreError(f"{path} is empty.")
+        try:
+            self._parse()
+        except (CardStoreError, struct.error, ValueError) as e:
+            # _parse() might fail after it created the arrays
+            # (e.g. invalid deck names), close() drops them first.
+            self.close()
+            raise CardStoreError(f"{path} is not a valid card store: {e}")
+
+    def _parse(self):
+        (magic, version, flags, count, decks,
+         offsets_at, lengths_at, picks_at, deck_ids_at, deck_names_at,
+         deck_names_size, blob_size) = _HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            raise CardStoreError("wrong magic number")
+        if version != FORMAT_VERSION:
+            raise CardStoreError(f"unsupported format version {version}")
+        buffer = self._mmap
+
+        # check the sizes first: once there are arrays, that use the
+        # mapping, it can not be closed anymore.
+        blob_start = _align(deck_names_at + deck_names_size)
+        for start, size in ((offsets_at, 4 * count), (lengths_at, 4 * count),
+                            (picks_at, count), (deck_ids_at, 2 * count),
+                            (deck_names_at, deck_names_size),
+                            (blob_start, blob_size)):
+            if start + size > len(buffer):
+                raise CardStoreError("truncated file")
+
+        self.offsets = np.frombuffer(
+            buffer, dtype="<u4", count=count, offset=offsets_at)
+        self.lengths = np.frombuffer(
+            buffer, dtype="<u4", count=count, offset=lengths_at)
+        self.picks = np.frombuffer(
+            buffer, dtype="u1", count=count, offset=picks_at)
+        self.deck_ids = np.frombuffer(
+            buffer, dtype="<u2", count=count, offset=deck_ids_at)
+        deck_names = bytes(
+            buffer[deck_names_at:deck_names_at + deck_names_size])
+        self.deck_names = \
+            deck_names.decode("utf-8").split("\0") if decks else []
+        self._blob_start = blob_start
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, index):
+        start = self._blob_start + int(self.offsets[index])
+        return self._mmap[start:start + int(self.lengths[index])] \
+            .decode("utf-8")
+
+    def close(self):
+        # the arrays keep the mapping alive, so it can not be closed
+        # before they are gone.
+        self.offsets = self.lengths = self.picks = self.deck_ids = None
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def black_cards(self):
+        """
+        Returns a CardSubset with the black cards.
+        """
+        return CardSubset(self, np.flatnonzero(self.picks > 0))
+
+    def white_cards(self):
+        """
+        Returns a CardSubset with the white cards.
+        """
+        return CardSubset(self, np.flatnonzero(self.picks == 0))
+
+
+class CardSubset:
+    """
+    A part of the cards of a CardStore, that can be used like a CardTable.
+    Index i refers to the card indices[i] of the store.
+    """
+
+    def __init__(self, store, indices):
+        self.store = store
+        self.indices = indices
+        self.picks = store.picks[indices]
+        self.picks.setflags(write=False)
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, index):
+        return self.store[int(self.indices[index])]
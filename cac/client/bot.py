@@ -0,0 +1,101 @@
+"""
+A headless player, that plays random cards.
+Used to put load on a server (see benchmarks/load_test.py).
+"""
+
+import asyncio
+import random
+import time
+
+from cac.client.server_connection import ServerConnection
+from cac.protocol import wire
+
+
+class Bot:
+    """
+    Joins a room and plays along:
+     - plays a card about `play_rate` times per second
+       (at most one per round, not as czar)
+     - as czar, votes for a played card about `vote_rate` times per second
+     - pings the server `ping_rate` times per second
+
+    The measured latencies (in seconds) are collected in
+    `ping_latencies` (Ping -> Pong) and `play_latencies`
+    (PlayCard -> the delta, that contains the card).
+    """
+
+    def __init__(self, name, room, play_rate=1, vote_rate=.5, ping_rate=1,
+                 seed=None):
+        self.name = name
+        self.room = room
+        self.play_rate = play_rate
+        self.vote_rate = vote_rate
+        self.ping_rate = ping_rate
+        self.ping_latencies = []
+        self.play_latencies = []
+        self.connection = ServerConnection(name)
+        self._random = random.Random(seed)
+        self._played = dict()
+        self._played_round = None
+
+    async def connect(self, host, port):
+        self.connection.on_message = self._on_message
+        await self.connection.connect(host, port)
+        await self.connection.join_room(self.room)
+
+    async def run(self, duration):
+        """
+        Plays for `duration` seconds.
+        """
+        tasks = [
+            asyncio.ensure_future(self._repeat(self.play_rate, self._play)),
+            asyncio.ensure_future(self._repeat(self.vote_rate, self._vote)),
+            asyncio.ensure_future(self._repeat(self.ping_rate, self._ping)),
+        ]
+        try:
+            await asyncio.sleep(duration)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def close(self):
+        self.connection.close()
+
+    async def _repeat(self, rate, action):
+        if rate <= 0:
+            return
+        while True:
+            # random intervals, so that the bots do not act in lockstep
+            await asyncio.sleep(self._random.expovariate(rate))
+            await action()
+
+    async def _play(self):
+        state = self.connection.room_state
+        if state is None or state.czar == self.connection.player \
+                or self._played_round == state.round:
+            return
+        card = self._random.randrange(1, 1 << 31)
+        self._played_round = state.round
+        self._played[card] = time.perf_counter()
+        self.connection.play_card(card)
+
+    async def _vote(self):
+        state = self.connection.room_state
+        if state is None or state.czar != self.connection.player \
+                or not state.played:
+            return
+        self.connection.vote(self._random.choice(list(state.played)))
+
+    async def _ping(self):
+        self.ping_latencies.append(await self.connection.ping())
+
+    def _on_message(self, message):
+        if type(message) is not wire.RoomDelta or not self._played:
+            return
+        for op, a, b in message.ops:
+            if op == wire.OP_CARD_PLAYED and a == self.connection.player:
+                played_at = self._played.pop(b, None)
+                if played_at is not None:
+                    self.play_latencies.append(
+                        time.perf_counter() - played_at)
@@ -6,8 +6,15 @@ import io
 import glob
 import os.path
 
+from cac.cards.store import CardStore
+
 assets_data = dict()
 
+# assets, that are not read, but memory-mapped when they are used.
+# maps the asset names to the paths of the files.
+assets_paths = dict()
+MAPPED_ASSET_EXTENSIONS = (".cards",)
+
 
 def load_assets_from_folder(assets_base_folder):
     """
@@ -20,19 +27,24 @@ def load_assets_from_folder(assets_base_folder):
         if not os.path.isfile(filename):
             continue
 
+        # large files are memory-mapped later on
+        key = os.path.relpath(filename, start=assets_base_folder)
+        if filename.endswith(MAPPED_ASSET_EXTENSIONS):
+            assets_paths[key] = filename
+            continue
+
         # read file
         with open(filename, "rb") as f:
             data = f.read()
 
         # store it in memory
-        key = os.path.relpath(filename, start=assets_base_folder)
         assets_data[key] = data
 
 
 def get_asset_data(asset_name):
     """
     Returns a byte array for the given asset.
-    asset_name is the path within the assets foolder.
+    asset_name is the path within the assets folder.
     raises a FileNotFound exception, if the given asset does not exist.
     """
     try:
@@ -41,10 +53,22 @@ def get_asset_data(asset_name):
         raise FileNotFoundError()
 
 
+def get_card_store(asset_name):
+    """
+    Returns the given card store (see cac.cards.store).
+    asset_name is the path within the assets folder.
+    raises a FileNotFound exception, if the given asset does not exist.
+    """
+    try:
+        return CardStore(assets_paths[asset_name])
+    except KeyError:
+        raise FileNotFoundError()
+
+
 def get_asset_file(asset_name):
     """
     Returns a file-like object for the given asset.
-    asset_name is the path within the assets foolder.
+    asset_name is the path within the assets folder.
     raises a FileNotFound exception, if the given asset does not exist.
     """
     data = get_asset_data(asset_name)
@@ -54,7 +78,7 @@ def get_asset_file(asset_name):
 def get_asset_text_file(asset_name):
     """
     Returns a text-file-like object for the given asset.
-    asset_name is the path within the assets foolder.
+    asset_name is the path within the assets folder.
     raises a FileNotFound exception, if the given asset does not exist.
     """
     binary_file = get_asset_file(asset_name)
@@ -21,8 +21,11 @@ class KeyboardEventSource(EventSource):
         self._win.keypad(1)
 
     def get_events(self):
+        # read all pending keys, so that pasted text
+        # does not trickle in with one key per frame
+        events = []
         key = self._win.getch()
-        if key != -1:
-            return [KeyboardEvent(key)]
-        else:
-            return []
+        while key != -1:
+            events.append(KeyboardEvent(key))
+            key = self._win.getch()
+        return events
@@ -12,6 +12,24 @@ class Game:
         self._max_framerate = 25
         self._event_sources = []
 
+        # how often the rendering of a game object could be skipped,
+        # because its render inputs did not change
+        # (see GameObject.get_render_inputs())
+        self.render_cache_hits = 0
+        self.render_cache_misses = 0
+
+        # time needed to process the last frame
+        # (in seconds, without the time spent waiting for the next frame)
+        self.frame_time = 0
+
+    @property
+    def frame_budget(self):
+        """
+        The time in seconds, that one frame may take at most
+        to reach the maximum framerate.
+        """
+        return 1.0 / self._max_framerate
+
     def exit(self):
         self._current_scene = None
 
@@ -89,6 +107,7 @@ class Game:
                 self._recursive_draw(scene, 0, 0, scene_w, scene_h, False)
                 curses.doupdate()
                 render_exception_cnt = 0
+                self.frame_time = time.time() - this_frame_time
             except Exception:
                 # count the number of exceptions - it is ok,
                 # if exceptions get raised - this might for
@@ -140,8 +159,18 @@ class Game:
         # rerender it
         if w != 0 and h != 0 and visible:
 
-            # render it into the dedicated pad
-            go.render(hk.render_pad)
+            # render it into the dedicated pad,
+            # unless the previous content is still up to date
+            render_inputs = go.get_render_inputs()
+            if render_inputs is None:
+                go.render(hk.render_pad)
+            elif render_inputs == hk.render_inputs and not hk.resized:
+                self.render_cache_hits += 1
+            else:
+                hk.render_inputs = None
+                go.render(hk.render_pad)
+                hk.render_inputs = render_inputs
+                self.render_cache_misses += 1
 
             # draw the pad on the screen.
             # clip coordinates, on the parent go
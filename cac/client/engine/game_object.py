@@ -11,6 +11,7 @@ class GameObjectHouseKeeping:
         self.render_pad = None
         self.resized = False
         self.mooved = False
+        self.render_inputs = None
 
 
 class GameObject(ABC):
@@ -98,6 +99,18 @@ class GameObject(ABC):
         """
         raise NotImplementedError()
 
+    def get_render_inputs(self):
+        """
+        Can be overridden by game objects, whose look rarely changes.
+        Should return a value (e.g. a tuple), that contains everything
+        that render() depends on, like texts, colours and the size.
+        As long as the value stays the same, render() is not called and
+        the previously rendered pad is shown again.
+        Returning None (the default) makes the game render the game object
+        in every frame.
+        """
+        return None
+
 
 class Scene(GameObject):
     """
@@ -0,0 +1,104 @@
+"""
+A text storage, that is efficient for editing at a cursor.
+"""
+
+
+class GapBuffer:
+    """
+    Stores text in a list of characters with a "gap" of unused
+    entries at the position of the last edit.
+
+    Inserting and deleting at the gap only moves the gap boundaries,
+    so typing at the cursor is O(1) amortised, independent of the
+    length of the text. Editing somewhere else first moves the gap there,
+    which costs O(distance).
+
+    Converting the buffer to a str is done lazily, the result is cached
+    until the next modification.
+    """
+
+    def __init__(self, text="", min_gap=16):
+        self._min_gap = min_gap
+        self._buffer = list(text) + [None] * min_gap
+        self._gap_start = len(text)
+        self._gap_end = len(self._buffer)
+        self._text = text
+
+    def __len__(self):
+        return len(self._buffer) - (self._gap_end - self._gap_start)
+
+    def __str__(self):
+        if self._text is None:
+            self._text = "".join(self._buffer[:self._gap_start]) + \
+                "".join(self._buffer[self._gap_end:])
+        return self._text
+
+    def _move_gap(self, pos):
+        """
+        Moves the gap to the given text position.
+        """
+        if pos < self._gap_start:
+            count = self._gap_start - pos
+            self._buffer[self._gap_end - count:self._gap_end] = \
+                self._buffer[pos:self._gap_start]
+            self._gap_start -= count
+            self._gap_end -= count
+        elif pos > self._gap_start:
+            count = pos - self._gap_start
+            self._buffer[self._gap_start:self._gap_start + count] = \
+                self._buffer[self._gap_end:self._gap_end + count]
+            self._gap_start += count
+            self._gap_end += count
+
+    def _ensure_gap(self, size):
+        """
+        Makes sure, that the gap has room for at least `size` characters.
+        The buffer grows geometrically, to keep inserting amortised O(1).
+        """
+        gap = self._gap_end - self._gap_start
+        if gap >= size:
+            return
+        grow = max(size - gap, len(self._buffer), self._min_gap)
+        self._buffer[self._gap_end:self._gap_end] = [None] * grow
+        self._gap_end += grow
+
+    def insert(self, pos, text):
+        """
+        Inserts the text (one or many characters) at the given position.
+        """
+        if not text:
+            return
+        self._move_gap(pos)
+        self._ensure_gap(len(text))
+        self._buffer[self._gap_start:self._gap_start + len(text)] = text
+        self._gap_start += len(text)
+        self._text = None
+
+    def delete(self, pos, count=1):
+        """
+        Deletes `count` characters, starting at the given position.
+        """
+        count = min(count, len(self) - pos)
+        if count <= 0:
+            return
+        self._move_gap(pos)
+        self._gap_end += count
+        self._text = None
+
+    def substring(self, start, end):
+        """
+        Returns the characters between the given positions
+        without converting the whole buffer to a str.
+        """
+        end = min(end, len(self))
+        if start >= end:
+            return ""
+        if self._text is not None:
+            return self._text[start:end]
+        gap = self._gap_end - self._gap_start
+        if end <= self._gap_start:
+            return "".join(self._buffer[start:end])
+        if start >= self._gap_start:
+            return "".join(self._buffer[start + gap:end + gap])
+        return "".join(self._buffer[start:self._gap_start]) + \
+            "".join(self._buffer[self._gap_end:end + gap])
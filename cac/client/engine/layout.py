@@ -17,23 +17,114 @@ class Layout(ABC):
     Each layout has a minimum size, that it needs to show all of its contents. Parents should respect this minimum
     size by giving the layout at least the space that it needs, if possible.
     Each layout is given an AABB from its parent, that it must be fully contained in.
+
+    Layout trees are meant to be built once and then applied every frame. The minimum size is measured only once
+    and cached, applying a layout with the same AABB as last time does nothing. Whenever a child or a constraint
+    of a layout changes, invalidate() must be called (the setters of the layouts in this module do this), which
+    throws away the cached values of the layout and all of its ancestors.
     """
 
+    def __init__(self):
+        self._parent = None
+        self._cached_min_size = None
+        self._last_aabb = None
+
     @property
-    @abstractmethod
     def min_size(self):
-        pass
+        if self._cached_min_size is None:
+            self._cached_min_size = self.measure()
+        return self._cached_min_size
 
     @abstractmethod
+    def measure(self):
+        """
+        Calculates the minimum size of the layout as a tuple (width, height).
+        """
+        pass
+
     def apply(self, parent_x, parent_y, parent_w, parent_h):
+        aabb = parent_x, parent_y, parent_w, parent_h
+        if aabb == self._last_aabb:
+            return
+        self._last_aabb = aabb
+        self.arrange(parent_x, parent_y, parent_w, parent_h)
+
+    @abstractmethod
+    def arrange(self, parent_x, parent_y, parent_w, parent_h):
+        """
+        Positions the contents of the layout within the given AABB.
+        """
         pass
 
     def applyParent(self, parent: GameObject):
         w, h = parent.size
         self.apply(0, 0, w, h)
 
+    def invalidate(self):
+        """
+        Forces the layout and all of its ancestors to be measured and arranged again.
+        """
+        layout = self
+        while layout is not None:
+            layout._cached_min_size = None
+            layout._last_aabb = None
+            layout = layout._parent
+
+    def _adopt(self, child):
+        if isinstance(child, Layout):
+            child._parent = self
+        return child
+
+
+_unset = object()
+
+
+class _Constraint:
+    """
+    An attribute of a layout, that invalidates the layout, when it is changed.
+    The value is stored in the attribute of the same name, prefixed with an underscore.
+    """
+
+    def __set_name__(self, owner, name):
+        self._name = "_" + name
+
+    def __get__(self, layout, owner):
+        if layout is None:
+            return self
+        return getattr(layout, self._name)
+
+    def __set__(self, layout, value):
+        if getattr(layout, self._name, _unset) == value:
+            return
+        setattr(layout, self._name, value)
+        layout.invalidate()
+
+
+class _Child(_Constraint):
+    """
+    A child of a layout. Just like a constraint, but child layouts also get to know their parent.
+    """
+
+    def __set__(self, layout, value):
+        super().__set__(layout, layout._adopt(value))
+
 
-class Layers(Layout):
+class _Container(Layout):
+    """
+    Base class of layouts with any number of children.
+    """
+
+    @property
+    def children(self):
+        return self._children
+
+    @children.setter
+    def children(self, value):
+        self._children = tuple(self._adopt(child) for child in value)
+        self.invalidate()
+
+
+class Layers(_Container):
     """
     Combines multiple layouts into a single one such that all of
     them share the same parent.
@@ -41,10 +132,9 @@ class Layers(Layout):
 
     def __init__(self, *children: Layout):
         super().__init__()
-        self._children = children
+        self.children = children
 
-    @property
-    def min_size(self):
+    def measure(self):
         min_w = 0
         min_h = 0
         for child in self._children:
@@ -53,10 +143,10 @@ class Layers(Layout):
             min_h = max(min_h, child_min_h)
         return min_w, min_h
 
-    def apply(self, parent_x, parent_y, parent_w, parent_h):
+    def arrange(self, parent_x, parent_y, parent_w, parent_h):
         for child in self._children:
             child.apply(parent_x, parent_y, parent_w, parent_h)
-            
+
 
 class Margin(Layout):
     """
@@ -78,6 +168,12 @@ class Margin(Layout):
 
     """
 
+    child = _Child()
+    margin_left = _Constraint()
+    margin_top = _Constraint()
+    margin_right = _Constraint()
+    margin_bottom = _Constraint()
+
     def __init__(self, child: Layout, left=None, top=None, right=None, bottom=None, horizontal=None, vertical=None, margin=0):
         super().__init__()
         horizontal = margin if horizontal is None else horizontal
@@ -86,20 +182,19 @@ class Margin(Layout):
         right = horizontal if right is None else right
         top = vertical if top is None else top
         bottom = vertical if bottom is None else bottom
-        self._margin_left = left
-        self._margin_top = top
-        self._margin_right = right
-        self._margin_bottom = bottom
-        self._child = child
+        self.margin_left = left
+        self.margin_top = top
+        self.margin_right = right
+        self.margin_bottom = bottom
+        self.child = child
 
-    @property
-    def min_size(self):
+    def measure(self):
         w, h = self._child.min_size
         w += self._margin_left + self._margin_right
         h += self._margin_top + self._margin_bottom
         return w, h
 
-    def apply(self, parent_x, parent_y, parent_w, parent_h):
+    def arrange(self, parent_x, parent_y, parent_w, parent_h):
         child_x = parent_x + self._margin_left
         child_y = parent_y + self._margin_top
         child_w = max(0, parent_w - self._margin_left - self._margin_right)
@@ -128,6 +223,12 @@ class SoftMargin(Layout):
 
     """
 
+    child = _Child()
+    margin_left = _Constraint()
+    margin_top = _Constraint()
+    margin_right = _Constraint()
+    margin_bottom = _Constraint()
+
     def __init__(self, child: Layout, left=None, top=None, right=None, bottom=None, horizontal=None, vertical=None, margin=0):
         super().__init__()
         horizontal = margin if horizontal is None else horizontal
@@ -136,17 +237,16 @@ class SoftMargin(Layout):
         right = horizontal if right is None else right
         top = vertical if top is None else top
         bottom = vertical if bottom is None else bottom
-        self._margin_left = left
-        self._margin_top = top
-        self._margin_right = right
-        self._margin_bottom = bottom
-        self._child = child
+        self.margin_left = left
+        self.margin_top = top
+        self.margin_right = right
+        self.margin_bottom = bottom
+        self.child = child
 
-    @property
-    def min_size(self):
+    def measure(self):
         return self._child.min_size
 
-    def apply(self, parent_x, parent_y, parent_w, parent_h):
+    def arrange(self, parent_x, parent_y, parent_w, parent_h):
         c_min_w, c_min_h = self._child.min_size
         space_x = parent_w - c_min_w           # 🚀
         space_y = parent_h - c_min_h
@@ -191,18 +291,24 @@ class Size(Layout):
 
     """
 
+    child = _Child()
+    pos_h = _Constraint()
+    pos_v = _Constraint()
+    preferred_width = _Constraint()
+    preferred_height = _Constraint()
+
     def __init__(self, child: Layout, pos_x=.5, pos_y=.5, width=0, height=0):
-        self._pos_h = pos_x
-        self._pos_v = pos_y
-        self._child = child
-        self._preferred_width = width
-        self._preferred_height = height        
+        super().__init__()
+        self.pos_h = pos_x
+        self.pos_v = pos_y
+        self.child = child
+        self.preferred_width = width
+        self.preferred_height = height
 
-    @property
-    def min_size(self):
+    def measure(self):
         return self._child.min_size
-    
-    def apply(self, parent_x, parent_y, parent_w, parent_h):
+
+    def arrange(self, parent_x, parent_y, parent_w, parent_h):
         pref_w = self._preferred_width
         pref_h = self._preferred_height
         if isinstance(pref_w, float):
@@ -217,9 +323,126 @@ class Size(Layout):
         self._child.apply(x, y, w, h)
 
 
-class Vertical(Layout):
+class Flex(_Container):
+    """
+    Arrangement of multiple child layouts in a row (or in a column, if `vertical` is set).
+    Every child gets at least its minimum size. The remaining space is shared between the children
+    according to their weights. By default, all children have the same weight.
+
+    +---------+-------------------+---------+
+    |Child 0  |Child 1            |Child 2  |
+    |         |                   |         |
+    |weight=1 |weight=2           |weight=1 |
+    |         |                   |         |
+    +---------+-------------------+---------+
+
+    Each child is measured exactly once, so measuring and arranging is linear in the number of children.
+    """
+
+    vertical = _Constraint()
+
+    def __init__(self, *children: Layout, weights: List[float] = None, vertical=False):
+        super().__init__()
+        self.children = children
+        self.weights = weights
+        self.vertical = vertical
+
+    @_Container.children.setter
+    def children(self, value):
+        value = tuple(value)
+        self._check_weights(value, getattr(self, "_weights", None))
+        _Container.children.fset(self, value)
+
+    @property
+    def weights(self):
+        return self._weights
+
+    @weights.setter
+    def weights(self, value):
+        self._check_weights(self._children, value)
+        if getattr(self, "_weights", _unset) == value:
+            return
+        self._weights = value
+        self.invalidate()
+
+    @staticmethod
+    def _check_weights(children, weights):
+        if weights is not None and len(weights) != len(children):
+            raise ValueError(
+                f"a flex layout needs one weight per child, "
+                f"not {len(weights)} for {len(children)} children")
+
+    def get_weights(self):
+        """
+        Returns the weight of each child.
+        """
+        if self._weights is None:
+            return [1] * len(self._children)
+        return self._weights
+
+    def measure(self):
+        min_along = 0
+        min_across = 0
+        for child in self._children:
+            child_min_w, child_min_h = child.min_size
+            if self._vertical:
+                child_min_w, child_min_h = child_min_h, child_min_w
+            min_along += child_min_w
+            min_across = max(min_across, child_min_h)
+        if self._vertical:
+            return min_across, min_along
+        return min_along, min_across
+
+    def arrange(self, parent_x, parent_y, parent_w, parent_h):
+        if self._vertical:
+            parent_x, parent_y = parent_y, parent_x
+            parent_w, parent_h = parent_h, parent_w
+        min_along = self.min_size[1 if self._vertical else 0]
+        additional_space = parent_w - min_along
+
+        # the additional space is distributed based on the cumulative weights,
+        # so that the rounding errors do not add up
+        weights = self.get_weights()
+        total_weight = sum(weights)
+        cumulative_weight = 0
+        distributed_space = 0
+
+        pos = parent_x
+        for child, weight in zip(self._children, weights):
+            child_min_size = child.min_size[1 if self._vertical else 0]
+            cumulative_weight += weight
+            space = 0
+            if total_weight > 0:
+                space = int(additional_space * cumulative_weight / total_weight) - distributed_space
+                distributed_space += space
+            size = child_min_size + space
+            if self._vertical:
+                child.apply(parent_y, pos, parent_h, size)
+            else:
+                child.apply(pos, parent_y, size, parent_h)
+            pos += size
+
+
+class _MainFlex(Flex):
+    """
+    Flex layout, that gives all the additional space
+    to the child with the index `main`.
+    """
+
+    main = _Constraint()
+
+    def __init__(self, main:int, *children: Layout, vertical=False):
+        super().__init__(*children, vertical=vertical)
+        self.main = main
+
+    def get_weights(self):
+        return [1 if i == self._main else 0 for i in range(len(self._children))]
+
+
+class Vertical(_MainFlex):
     """
     Vertical arrangement of multiple child layouts.
+    All the additional space is given to the child with the index `main`.
 
     +---------------------+
     |Child 0              |
@@ -238,49 +461,106 @@ class Vertical(Layout):
     """
 
     def __init__(self, main:int, *children: Layout):
-        self._children = children
-        self._main = main
+        super().__init__(main, *children, vertical=True)
+
+
+class Horizontal(_MainFlex):
+    """
+    Horizontal arrangement of multiple child layouts.
+    All the additional space is given to the child with the index `main`.
+
+    +---------+-------------------+---------+
+    |Child 0  |Child 1            |Child 2  |
+    |         |                   |         |
+    |         |                   |         |
+    +---------+-------------------+---------+
+
+    """
+
+    def __init__(self, main:int, *children: Layout):
+        super().__init__(main, *children)
+
+
+class Grid(_Container):
+    """
+    Arranges the child layouts in a grid with the given number of columns,
+    row by row. All cells have the same size, the minimum size of a cell is
+    the largest minimum size of all children.
+
+    +-------+-------+-------+
+    |Child 0|Child 1|Child 2|
+    +-------+-------+-------+
+    |Child 3|Child 4|       |
+    +-------+-------+-------+
+
+    """
+
+    def __init__(self, columns: int, *children: Layout):
+        super().__init__()
+        self.columns = columns
+        self.children = children
 
     @property
-    def min_size(self):
-        min_w = 0
-        min_h = 0
+    def columns(self):
+        return self._columns
+
+    @columns.setter
+    def columns(self, value):
+        if value < 1:
+            raise ValueError(f"a grid needs at least one column, not {value}")
+        if getattr(self, "_columns", _unset) == value:
+            return
+        self._columns = value
+        self.invalidate()
+
+    @property
+    def shape(self):
+        """
+        The number of columns and rows, that are actually used.
+        """
+        nr_children = len(self._children)
+        columns = min(self._columns, nr_children)
+        rows = -(-nr_children // self._columns)
+        return columns, rows
+
+    def measure(self):
+        cell_w = 0
+        cell_h = 0
         for child in self._children:
             child_min_w, child_min_h = child.min_size
-            min_w = max(min_w, child_min_w)
-            min_h += child_min_h
-        return min_w, min_h 
-
-    def apply(self, parent_x, parent_y, parent_w, parent_h):
-        min_w, min_h = self.min_size
-        additional_height = parent_h - min_h
+            cell_w = max(cell_w, child_min_w)
+            cell_h = max(cell_h, child_min_h)
+        columns, rows = self.shape
+        return cell_w * columns, cell_h * rows
 
-        pos_y = parent_y
+    def arrange(self, parent_x, parent_y, parent_w, parent_h):
+        columns, rows = self.shape
         for i, child in enumerate(self._children):
-            child_min_w, child_min_h = child.min_size
-            x = parent_x
-            y = pos_y
-            w = parent_w
-            h = child_min_h
-            if i == self._main:
-                h += additional_height
+            column = i % columns
+            row = i // columns
+            x = parent_x + parent_w * column // columns
+            y = parent_y + parent_h * row // rows
+            w = parent_x + parent_w * (column + 1) // columns - x
+            h = parent_y + parent_h * (row + 1) // rows - y
             child.apply(x, y, w, h)
-            pos_y += h
 
 
 class Place(Layout):
 
+    child = _Child()
+    min_width = _Constraint()
+    min_height = _Constraint()
+
     def __init__(self, child: Union[GameObject, Callable[[int, int, int, int], Any]], min_width=0, min_height=0):
         super().__init__()
-        self._child = child
-        self._min_w = min_width
-        self._min_h = min_height
+        self.child = child
+        self.min_width = min_width
+        self.min_height = min_height
 
-    @property
-    def min_size(self):
-        return self._min_w, self._min_h
+    def measure(self):
+        return self._min_width, self._min_height
 
-    def apply(self, parent_x, parent_y, parent_w, parent_h):
+    def arrange(self, parent_x, parent_y, parent_w, parent_h):
         if isinstance(self._child, GameObject):
             self._child.position = parent_x, parent_y
             self._child.size = parent_w, parent_h
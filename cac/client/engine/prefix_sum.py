@@ -0,0 +1,121 @@
+"""
+A prefix sum index (Fenwick tree) over a list of non-negative integers.
+"""
+
+
+class PrefixSumIndex:
+    """
+    Stores a list of non-negative integers (e.g. the heights of list items)
+    and answers the following questions in O(log n):
+     - What is the sum of the first i values? (prefix_sum())
+     - Which value contains the position p, if all values are laid out
+       one after another? (find())
+
+    Changing a value and appending or removing the last value
+    take O(log n) as well. Inserting or removing values anywhere else
+    rebuilds the index in O(n).
+    """
+
+    def __init__(self, values=()):
+        self._values = []
+        self._tree = [0]
+        self.rebuild(values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __getitem__(self, index):
+        return self._values[index]
+
+    @property
+    def total(self):
+        """
+        The sum of all values.
+        """
+        return self.prefix_sum(len(self._values))
+
+    def rebuild(self, values):
+        """
+        Replaces all values in O(n).
+        """
+        self._values = list(values)
+        self._tree = [0] + self._values
+        for i in range(1, len(self._tree)):
+            parent = i + (i & -i)
+            if parent < len(self._tree):
+                self._tree[parent] += self._tree[i]
+
+    def prefix_sum(self, count):
+        """
+        Returns the sum of the first `count` values.
+        """
+        result = 0
+        i = count
+        while i > 0:
+            result += self._tree[i]
+            i -= i & -i
+        return result
+
+    def set(self, index, value):
+        """
+        Changes the value at the given index.
+        """
+        delta = value - self._values[index]
+        self._values[index] = value
+        i = index + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def append(self, value):
+        """
+        Adds a value to the end.
+        """
+        i = len(self._tree)
+        self._values.append(value)
+        # the new node covers the values (i - lowbit(i), i]
+        self._tree.append(
+            self.prefix_sum(i - 1) - self.prefix_sum(i - (i & -i)) + value)
+
+    def pop(self):
+        """
+        Removes the last value.
+        """
+        self._tree.pop()
+        return self._values.pop()
+
+    def insert(self, index, value):
+        if index >= len(self._values):
+            self.append(value)
+        else:
+            values = self._values
+            values.insert(index, value)
+            self.rebuild(values)
+
+    def remove(self, index):
+        if index == len(self._values) - 1:
+            self.pop()
+        else:
+            values = self._values
+            del values[index]
+            self.rebuild(values)
+
+    def find(self, position):
+        """
+        Returns the index of the value, that contains the given position,
+        i.e. the largest index i with prefix_sum(i) <= position.
+        Positions beyond the total are mapped to len(self).
+        """
+        index = 0
+        remaining = position
+        step = 1
+        while step * 2 < len(self._tree):
+            step *= 2
+        while step > 0:
+            next_index = index + step
+            if next_index < len(self._tree) \
+                    and self._tree[next_index] <= remaining:
+                index = next_index
+                remaining -= self._tree[index]
+            step //= 2
+        return index
@@ -0,0 +1,67 @@
+"""
+Adaptive quality control.
+Lets expensive game objects trade visual quality
+for speed, if the game can not keep up with its framerate.
+"""
+
+
+class AdaptiveQuality:
+    """
+    Picks a scale factor based on the measured frame time of a game.
+
+    The scale factor is an integer >= 1. A game object that uses it
+    should compute its content on a grid, that is coarser by this
+    factor (and scale it up afterwards). The scale factor is increased,
+    if the frames take longer than `high` times the frame budget
+    of the game and decreased again, if the frames take less than
+    `low` times the frame budget.
+
+    Call update() once per frame, e.g. from the update() method
+    of the game object.
+    """
+
+    def __init__(self, game, min_scale=1, max_scale=4,
+                 low=.4, high=.8, smoothing=.1, cooldown=10):
+        """
+        :param game: The cac.client.engine.game_loop.Game instance,
+                     whose frame time is measured.
+        :param min_scale:
+        :param max_scale: Bounds for the scale factor.
+        :param low:
+        :param high: Fractions of the frame budget.
+                     See the class documentation.
+        :param smoothing: Weight of the latest frame time
+                          in the moving average.
+        :param cooldown: Number of frames to wait after changing the scale,
+                         before it may be changed again.
+        """
+        self._game = game
+        self._min_scale = min_scale
+        self._max_scale = max_scale
+        self._low = low
+        self._high = high
+        self._smoothing = smoothing
+        self._cooldown = cooldown
+        self._frames_since_change = 0
+        self.average_frame_time = 0
+        self.scale = min_scale
+
+    def update(self):
+        """
+        Incorporates the time of the last frame and adapts the scale factor.
+        """
+        self.average_frame_time += self._smoothing * \
+            (self._game.frame_time - self.average_frame_time)
+        self._frames_since_change += 1
+        if self._frames_since_change < self._cooldown:
+            return
+
+        budget = self._game.frame_budget
+        if self.average_frame_time > budget * self._high \
+                and self.scale < self._max_scale:
+            self.scale += 1
+            self._frames_since_change = 0
+        elif self.average_frame_time < budget * self._low \
+                and self.scale > self._min_scale:
+            self.scale -= 1
+            self._frames_since_change = 0
@@ -0,0 +1,147 @@
+"""
+Animated backgrounds, that are computed for all characters
+of a game object at once using numpy ("shaders").
+
+A shader is a function `shader(x, y, t)`, that gets the coordinates of
+the characters and the time and returns the index of the style
+to use for each character.
+
+ - `x` is an array of shape (w, 1), `y` an array of shape (1, h).
+   Both are given in characters, relative to the center of the
+   game object, so they broadcast to the full (w, h) grid.
+ - `t` is the time in seconds since the background was created.
+ - The result must be an integer array, that broadcasts to (w, h).
+   It contains indices into the list of styles of the background.
+
+ShaderBackground takes care of the rest: the coordinate grids are
+cached, the styles are mapped to curses attributes and every run of
+equally styled characters is drawn at once.
+
+Example - diagonal stripes, that move to the right:
+
+>>> def stripes(x, y, t):
+...     return ((x + y - t * 10) // 4) % 2
+>>> bg = ShaderBackground(stripes, [
+...     ('/', (1, 1, 1), (0, 0, 0)),
+...     (' ', (0, 0, 0), (0, 0, 0)),
+... ])
+>>> bg.size = 8, 2
+>>> bg.get_frame().T
+array([[0, 1, 1, 1, 1, 0, 0, 0],
+       [1, 1, 1, 1, 0, 0, 0, 0]], dtype=uint8)
+"""
+
+import functools
+import curses
+
+import numpy as np
+
+from cac.client.engine.game_object import GameObject
+from cac.client.engine.curses_colour import get_colour_pair
+
+
+@functools.lru_cache(maxsize=8)
+def get_coordinate_grid(w, h, scale=1):
+    """
+    Returns the coordinates (x, y) of every scale-th column and row
+    of a w x h grid of characters, relative to its center.
+    The result is cached and must not be modified.
+    """
+    xs = (np.arange(0, w, scale) - w / 2).reshape(-1, 1)
+    ys = (np.arange(0, h, scale) - h / 2).reshape(1, -1)
+    xs.flags.writeable = False
+    ys.flags.writeable = False
+    return xs, ys
+
+
+def upscale_frame(frame, w, h, scale):
+    """
+    Scales a frame of style indices, that was computed
+    using get_coordinate_grid(w, h, scale) up to the size w x h.
+    """
+    if scale > 1:
+        frame = frame.repeat(scale, axis=0).repeat(scale, axis=1)
+    return frame[:w, :h]
+
+
+def draw_style_frame(pad, frame, characters, formats):
+    """
+    Draws a frame of style indices of shape (w, h) onto a curses pad.
+    Style i is drawn using the character `characters[i]`
+    and the text format `formats[i]`.
+    Every run of equally styled characters in a row is drawn
+    with a single call to addstr().
+    """
+    w, h = frame.shape
+    for y in range(h):
+        row = frame[:, y]
+        run_starts = np.flatnonzero(row[1:] != row[:-1]) + 1
+        run_starts = [0] + run_starts.tolist()
+        run_ends = run_starts[1:] + [w]
+        for start, end in zip(run_starts, run_ends):
+            style = row[start]
+            try:
+                pad.addstr(
+                    y, start,
+                    characters[style] * (end - start),
+                    formats[style])
+            except curses.error:
+                # the lower right corner raises an error after drawing
+                pass
+
+
+class ShaderBackground(GameObject):
+    """
+    A game object, that fills itself with the output of a shader.
+
+    :param shader: The shader function, see the module documentation.
+    :param styles: A list of tuples (character, fg colour, bg colour),
+                   that the style indices returned by the shader refer to.
+    :param scale: The shader is evaluated on a grid, that is
+                  coarser by this factor.
+
+    Backgrounds, whose frames are not just a function of the time,
+    can override get_frame() (and get_styles()) instead of passing
+    a shader, and still use the drawing of this class.
+    """
+
+    def __init__(self, shader=None, styles=(), scale=1):
+        super().__init__()
+        self.shader = shader
+        self.styles = list(styles)
+        self.scale = scale
+        self.time = 0
+
+    def get_child_objects(self):
+        return []
+
+    def process_event(self, event):
+        pass
+
+    def update(self, delta_time):
+        self.time += delta_time
+
+    def get_styles(self):
+        """
+        Returns the styles as a list of tuples
+        (character, fg colour, bg colour).
+        """
+        return self.styles
+
+    def get_frame(self):
+        """
+        Returns the style index of every character
+        as an array of shape (w, h).
+        """
+        w, h = self.size
+        xs, ys = get_coordinate_grid(w, h, self.scale)
+        frame = np.asarray(self.shader(xs, ys, self.time))
+        frame = np.broadcast_to(frame, (xs.shape[0], ys.shape[1]))
+        return upscale_frame(frame.astype(np.uint8), w, h, self.scale)
+
+    def render(self, pad):
+        frame = self.get_frame()
+        styles = self.get_styles()
+        characters = [character for character, _, _ in styles]
+        formats = [get_colour_pair(fg, bg) for _, fg, bg in styles]
+        draw_style_frame(pad, frame, characters, formats)
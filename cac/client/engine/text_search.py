@@ -0,0 +1,90 @@
+"""
+Fast substring search over many short texts.
+"""
+
+from collections import defaultdict
+
+
+class NGramIndex:
+    """
+    An index, that finds all documents containing a substring.
+
+    Documents are added with an arbitrary hashable key. For every document,
+    all substrings with up to `n` characters (the "n-grams") are stored
+    together with the keys of the documents, in which they occur.
+    A query is answered by intersecting the document sets of its n-grams,
+    so only the documents, that contain all of them, have to be checked.
+
+    The search is case insensitive.
+    """
+
+    def __init__(self, n=3):
+        self._n = n
+        self._postings = defaultdict(set)
+        self._texts = dict()
+
+    def __len__(self):
+        return len(self._texts)
+
+    def _ngrams(self, text, n):
+        return {text[i:i + k]
+                for k in range(1, n + 1)
+                for i in range(len(text) - k + 1)}
+
+    def add(self, key, text):
+        """
+        Adds (or replaces) the document with the given key.
+        """
+        if key in self._texts:
+            self.remove(key)
+        text = text.lower()
+        self._texts[key] = text
+        for ngram in self._ngrams(text, self._n):
+            self._postings[ngram].add(key)
+
+    def remove(self, key):
+        """
+        Removes the document with the given key.
+        """
+        text = self._texts.pop(key)
+        for ngram in self._ngrams(text, self._n):
+            keys = self._postings[ngram]
+            keys.discard(key)
+            if not keys:
+                del self._postings[ngram]
+
+    def search(self, query):
+        """
+        Returns the set of keys of all documents, that contain the query.
+        """
+        query = query.lower()
+        if not query:
+            return set(self._texts)
+
+        # the n-grams, that cover the whole query
+        n = min(self._n, len(query))
+        ngrams = {query[i:i + n] for i in range(len(query) - n + 1)}
+
+        # intersect, starting with the rarest n-gram
+        candidate_sets = sorted(
+            (self._postings.get(ngram, set()) for ngram in ngrams), key=len)
+        result = set(candidate_sets[0])
+        for candidates in candidate_sets[1:]:
+            result &= candidates
+            if not result:
+                break
+
+        # the n-grams might occur in the wrong order
+        if len(query) > self._n:
+            result = {key for key in result if query in self._texts[key]}
+        return result
+
+    def refine(self, keys, query):
+        """
+        Filters the given keys (an iterable, e.g. the result of
+        an earlier search) down to the documents, that contain the query.
+        The order of the keys is preserved.
+        This is the fast path, when the user extends a query.
+        """
+        query = query.lower()
+        return [key for key in keys if query in self._texts[key]]
@@ -1,14 +1,19 @@
 import numpy as np
+import threading
 import random
 import math
-import curses
 from typing import Optional
 
-from cac.client.engine.game_object import GameObject
-from cac.client.engine.curses_colour import get_colour_pair
+from cac.client.engine.shader import ShaderBackground, \
+    get_coordinate_grid, upscale_frame
 
 random.seed()
 
+# the styles, that a "pixel" of the background can have
+STYLE_BORDER = 0
+STYLE_1 = 1
+STYLE_2 = 2
+
 
 def get_random_wave_parameters():
     angle = random.random() * math.pi * 2
@@ -18,19 +23,18 @@ def get_random_wave_parameters():
     return angle, wavelenght, amplitude, phase
 
 
-def eval_wave(w, h, angle, wavelenght, amplitude, phase):
+def eval_wave(w, h, angle, wavelenght, amplitude, phase, scale=1):
+    """
+    Evaluates a sine wave on a grid of w x h characters.
+    With a scale > 1, only every scale-th row and column is evaluated,
+    so the result has the shape (ceil(w / scale), ceil(h / scale)).
+    """
     dy = math.sin(angle)
     dx = math.cos(angle)
-    center_x = w / 2
-    center_y = h / 2
     frequency = 1 / wavelenght
-    data = np.zeros((w, h))
-    for x in range(w):
-        for y in range(h):
-            t = (x-center_x) * dx + (y-center_y) * dy
-            data[x, y] = math.sin(t * frequency * 2 * math.pi + phase) * \
-                amplitude
-    return data
+    xs, ys = get_coordinate_grid(w, h, scale)
+    t = xs * dx + ys * dy
+    return np.sin(t * frequency * 2 * math.pi + phase) * amplitude
 
 
 def interpolate_wave_parameters(t, angle_1, wavelenght_1, amplitude_1, phase_1,
@@ -98,13 +102,117 @@ def match_wave_parameters(wa1, wa2, wa3, wb1, wb2, wb3):
         return wa1, wb3, wa2, wb2, wa3, wb1
 
 
-class HypnoBackground(GameObject):
-
-    def __init__(self, transition_from: Optional['HypnoBackground'] = None):
+class PatternWorker:
+    """
+    Computes background patterns on a separate thread.
+
+    The results are published through a double buffer:
+    The worker thread only ever writes into the back buffer,
+    the game loop only ever reads from the front buffer.
+    Once a pattern is finished, the worker waits until the game loop
+    swapped the buffers (see swap()) before it starts the next one.
+    Swapping just exchanges two references, so the game loop
+    never has to wait for a calculation to finish.
+
+    The `compute` function is called as `compute(key)`, where `key`
+    is the value passed to request(). It has to return the new pattern.
+    """
+
+    def __init__(self, compute):
+        self._compute = compute
+        self._condition = threading.Condition()
+        self._request = None
+        self._front = None, None
+        self._back = None, None
+        self._back_ready = False
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def request(self, key):
+        """
+        Asks the worker to compute the pattern for the given key.
+        Older requests, that have not been started yet, are dropped.
+        """
+        with self._condition:
+            self._request = key
+            self._condition.notify()
+
+    def swap(self):
+        """
+        Makes the most recently finished pattern the front buffer.
+        Returns the front buffer as a tuple (key, pattern).
+        Both values are None, if no pattern was computed yet.
+        """
+        with self._condition:
+            if self._back_ready:
+                self._front, self._back = self._back, self._front
+                self._back_ready = False
+                self._condition.notify()
+            return self._front
+
+    def stop(self):
+        """
+        Terminates the worker thread.
+        """
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+
+            # wait for something to do
+            with self._condition:
+                while self._running and \
+                        (self._request is None or self._back_ready):
+                    self._condition.wait()
+                if not self._running:
+                    return
+                key = self._request
+                self._request = None
+
+            # do the maths without holding the lock
+            pattern = self._compute(key)
+
+            # publish the result
+            with self._condition:
+                self._back = key, pattern
+                self._back_ready = True
+
+
+class HypnoBackground(ShaderBackground):
+    """
+    Three overlaid sine waves, that slowly blend over from
+    another background.
+
+    The frames only depend on the position within the transition,
+    not directly on the time, so instead of a shader, this overrides
+    get_frame(): the transition is quantised into transition_steps
+    frames, that are memoised and optionally computed on a worker thread.
+    """
+
+    def __init__(self, transition_from: Optional['HypnoBackground'] = None,
+                 threaded=False):
+        """
+        :param transition_from: The background to slowly blend over from.
+        :param threaded: Compute the transition frames on a worker thread,
+                         instead of within render().
+        """
 
         super().__init__()
 
-        self.last_bg_pattern = np.zeros((0, 0))
+        # the currently shown frame.
+        # a frame stores the style (see STYLE_*) of each "pixel"
+        self.last_bg_styles = np.zeros((0, 0), dtype=np.uint8)
+        self._last_bg_styles_key = None
+
+        # memoised frames, see get_style_frame().
+        # the worker thread uses the cache as well.
+        self._frame_cache_lock = threading.Lock()
+        self._frame_cache = dict()
+        self._frame_cache_size = None
+        self._frame_cache_generation = 0
 
         self.wave_parameters = tuple(get_random_wave_parameters()
                                      for i
@@ -126,6 +234,24 @@ class HypnoBackground(GameObject):
         self.transition_pos = 1.0 if transition_from is None else 0.0
         self.transition_speed = 1
 
+        # the transition is quantised into this many distinct frames
+        self.transition_steps = 128
+
+        # the pattern is computed on a grid, that is coarser by this factor.
+        # if `quality` is set to an AdaptiveQuality instance,
+        # the scale is chosen automatically.
+        self.scale = 1
+        self.quality = None
+
+        # the time between two frames, used to predict the
+        # transition position of the next frame
+        self._last_delta_time = 0
+
+        # optional worker thread
+        self._worker = None
+        if threaded:
+            self._worker = PatternWorker(self._compute_worker_frame)
+
         # make the transition animation match nicely
         if transition_from is not None:
             wa1, wb1, wa2, wb2, wa3, wb3 = match_wave_parameters(
@@ -134,59 +260,153 @@ class HypnoBackground(GameObject):
             self.wave_parameters = wa1, wa2, wa3
             transition_from.wave_parameters = wb1, wb2, wb3
 
-    def get_child_objects(self):
-        return []
+    @property
+    def wave_parameters(self):
+        return self._wave_parameters
 
-    def process_event(self, event):
-        pass
+    @wave_parameters.setter
+    def wave_parameters(self, value):
+        # memoised frames are only valid for the old parameters
+        with self._frame_cache_lock:
+            self._wave_parameters = value
+            self._frame_cache = dict()
+            self._frame_cache_generation += 1
 
     def update(self, delta_time):
+        super().update(delta_time)
         self.transition_pos += delta_time * self.transition_speed
-
-    def render(self, pad):
-
-        # check, if the pattern needs to be recalculated
-        if self.size != self.last_bg_pattern.shape or self.transition_pos < 1.0:
-            self.update_bg_pattern()
-
-        # draw
-        w, h = self.size
-        for x in range(w):
-            for y in range(h):
-
-                # get the style for the current "pixel"
-                pattern_value = self.last_bg_pattern[x, y]
-                if pattern_value > .1:
-                    style_character = self.style1_character
-                    style_colour_fg = self.style1_colour_fg
-                    style_colour_bg = self.style1_colour_bg
-                elif pattern_value < -.1:
-                    style_character = self.style2_character
-                    style_colour_fg = self.style2_colour_fg
-                    style_colour_bg = self.style2_colour_bg
-                else:
-                    style_character = self.border_character
-                    style_colour_fg = self.border_colour_fg
-                    style_colour_bg = self.border_colour_bg
-
-                # draw
-                try:
-                    pad.addstr(
-                        y, x,
-                        style_character,
-                        get_colour_pair(*style_colour_fg, *style_colour_bg))
-                except curses.error:
-                    pass
-
-    def update_bg_pattern(self):
-
-        # reset the pattern
-        self.last_bg_pattern = np.zeros(self.size)
+        self._last_delta_time = delta_time
+        if self.quality is not None:
+            self.quality.update()
+            self.scale = self.quality.scale
+
+    def stop(self):
+        """
+        Stops the worker thread, if there is one.
+        """
+        if self._worker is not None:
+            self._worker.stop()
+            self._worker = None
+
+    def get_styles(self):
+        # in the order of the STYLE_* constants
+        return [
+            (self.border_character,
+             self.border_colour_fg, self.border_colour_bg),
+            (self.style1_character,
+             self.style1_colour_fg, self.style1_colour_bg),
+            (self.style2_character,
+             self.style2_colour_fg, self.style2_colour_bg),
+        ]
+
+    def get_frame(self):
+        if self._worker is not None:
+            self.update_bg_styles_threaded()
+        else:
+            self.update_bg_styles()
+        return self.last_bg_styles
+
+    def transition_step(self, transition_pos):
+        """
+        Quantises a position within the transition.
+        Returns an integer between 0 and transition_steps,
+        where transition_steps stands for the finished transition.
+        """
+        if self.transition_from is None or transition_pos >= 1.0:
+            return self.transition_steps
+        return max(0, int(transition_pos * self.transition_steps))
+
+    def update_bg_styles_threaded(self):
+        """
+        Takes the latest frame from the worker thread and
+        asks it to compute the frame for the next frame.
+        """
+
+        # swap the buffers
+        key, styles = self._worker.swap()
+        if styles is not None and styles.shape == self.size:
+            self.last_bg_styles = styles
+            self._last_bg_styles_key = key
+
+        # after a resize, there is nothing useful to show
+        # until the worker caught up - so calculate it right here.
+        if self.last_bg_styles.shape != self.size:
+            self.update_bg_styles()
+
+        # aim at the expected transition position of the next frame
+        next_pos = self.transition_pos + \
+            self._last_delta_time * self.transition_speed
+        next_key = self.size, self.transition_step(next_pos), self.scale
+        if next_key != self._last_bg_styles_key:
+            self._worker.request(next_key)
+
+    def _compute_worker_frame(self, key):
+        size, step, scale = key
+        return self._get_frame_for_step(size, step, scale)
+
+    def update_bg_styles(self):
+        key = self.size, self.transition_step(self.transition_pos), self.scale
+        if key != self._last_bg_styles_key:
+            self.last_bg_styles = self._get_frame_for_step(*key)
+            self._last_bg_styles_key = key
+
+    def get_style_frame(self, size, transition_pos, scale=1):
+        """
+        Returns the frame for the given size and position
+        within the transition.
+        Frames are generated lazily and memoised, so that showing
+        (or replaying) a transition only costs the drawing.
+        The returned array must not be modified.
+        """
+        step = self.transition_step(transition_pos)
+        return self._get_frame_for_step(size, step, scale)
+
+    def _get_frame_for_step(self, size, step, scale):
+        key = size, step, scale
+        with self._frame_cache_lock:
+            frame = self._frame_cache.get(key)
+            generation = self._frame_cache_generation
+        if frame is not None:
+            return frame
+
+        pattern = self.compute_bg_pattern(
+            size, step / self.transition_steps, scale)
+        frame = self.classify_pattern(pattern, size, scale)
+
+        with self._frame_cache_lock:
+            # the wave parameters changed in the meantime
+            if generation != self._frame_cache_generation:
+                return frame
+            # a resize makes all memoised frames useless
+            if size != self._frame_cache_size:
+                self._frame_cache = dict()
+                self._frame_cache_size = size
+            self._frame_cache[key] = frame
+        return frame
+
+    @staticmethod
+    def classify_pattern(pattern, size, scale=1):
+        """
+        Maps a (possibly coarse) pattern to a frame of style indices
+        of the given size.
+        """
+        styles = np.full(pattern.shape, STYLE_BORDER, dtype=np.uint8)
+        styles[pattern > .1] = STYLE_1
+        styles[pattern < -.1] = STYLE_2
+        return upscale_frame(styles, *size, scale)
+
+    def compute_bg_pattern(self, size, transition_pos, scale=1):
+        """
+        Calculates the background pattern for the given size and
+        position within the transition.
+        The pattern is evaluated on a grid, that is coarser by the factor
+        `scale`, so its shape is (ceil(w / scale), ceil(h / scale)).
+        """
 
         # incorporate transitions
-        if self.transition_from is not None and self.transition_pos < 1.0:
+        if self.transition_from is not None and transition_pos < 1.0:
             all_wave_parameters = (interpolate_wave_parameters(
-                self.transition_pos,
+                transition_pos,
                 *self.transition_from.wave_parameters[i],
                 *self.wave_parameters[i]
                 )
@@ -196,6 +416,9 @@ class HypnoBackground(GameObject):
             all_wave_parameters = self.wave_parameters
 
         # calculate the pattern
+        w, h = size
+        pattern = np.zeros((-(-w // scale), -(-h // scale)))
         for wave_params in all_wave_parameters:
-            self.last_bg_pattern += eval_wave(*self.size, *wave_params)
-        self.last_bg_pattern = self.last_bg_pattern / len(self.wave_parameters)
+            pattern += eval_wave(w, h, *wave_params, scale=scale)
+        pattern /= len(self.wave_parameters)
+        return pattern
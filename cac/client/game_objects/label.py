@@ -19,6 +19,9 @@ class Label(GameObject):
     def process_event(self, event):
         pass
 
+    def get_render_inputs(self):
+        return self.text, self.text_fg_colour, self.text_bg_colour, self.size
+
     def render(self, win):
         w, h = self.size
 
@@ -15,6 +15,9 @@ class UiFrame(GameObject):
     def process_event(self, event):
         pass
 
+    def get_render_inputs(self):
+        return self.size
+
     def render(self, win):
         
         # make a  white bg
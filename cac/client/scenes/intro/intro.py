@@ -3,6 +3,7 @@ from cac.client.engine.game_loop import Game
 from cac.client.scenes.intro.title import TitleBox
 from cac.client.scenes.select_server.select_server import SelectServerScene
 from cac.client.engine.events_keyboard import KeyboardEvent
+from cac.client.engine.quality import AdaptiveQuality
 from cac.client.game_objects.background import HypnoBackground
 
 
@@ -14,14 +15,20 @@ class IntroScene(Scene):
         self._titlebox = TitleBox()
         self._time = 0
         self._game: Game = None
-        self._bg = HypnoBackground(transition_from=HypnoBackground())
+        self._bg = HypnoBackground(
+            transition_from=HypnoBackground(), threaded=True)
         self._bg.transition_speed = 1.0 / 6
 
+        # the next scene takes over the background (and stops it)
+        self._bg_handed_over = False
+
     def start_scene(self, game):
         self._game = game
+        self._bg.quality = AdaptiveQuality(game)
 
     def stop_scene(self):
-        pass
+        if not self._bg_handed_over:
+            self._bg.stop()
 
     def get_child_objects(self):
         return [self._bg, self._titlebox]
@@ -55,6 +62,7 @@ class IntroScene(Scene):
 
     def next_scene(self):
         next_scene = SelectServerScene(self._bg)
+        self._bg_handed_over = True
         self._game.load_scene(next_scene)
 
     def render(self, win):
@@ -29,6 +29,9 @@ class TitleBox(GameObject):
         w, h = self.size
         self.size = w, int(self._opening_animation.value)
 
+    def get_render_inputs(self):
+        return self.size
+
     def render(self, win):
 
         # make a  white bg
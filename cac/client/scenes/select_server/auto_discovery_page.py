@@ -1,39 +1,27 @@
-import threading
-import socket
-
-from zeroconf import ServiceBrowser, ServiceStateChange, Zeroconf
+import time
 
 from cac.client.scenes.select_server.list_box import ListBox, ListBoxItem
+from cac.client.scenes.select_server.server_discovery import \
+    ServerDiscovery
 from cac.client.engine.game_object import GameObject
+from cac.protocol.constants import PROTOCOL_VERSION
 from cac.client.engine.events import EventPropagation
 from cac.client.engine.curses_colour import get_colour_pair
 from cac.client.engine.curses_text import render_text, \
     TextAlignment, VerticalTextAlignment
 
 
-class Server():
-
-    def __init__(self, name="",
-                 zeroconf_server_name="", address="", port=1337):
-        self.address = address
-        self.name = name
-        self.zeroconf_server_name = zeroconf_server_name
-        self.port = port
-
-
 class SelectAutoDiscoveryServer(GameObject):
 
     def __init__(self):
         super().__init__()
 
         # server auto discovery
-        self._discovered_servers = []
-        self._discovered_servers_lock = threading.Lock()
-        self._zeroconf = None
-        self._browser = None
+        self._discovery = ServerDiscovery(persist=True)
+        self._shown_version = None
 
         # discovered server selection
-        self._server_list_box = ListBox()
+        self._server_list_box = ListBox(virtualised=True)
         self._server_list_box_visible = False
 
     def get_child_objects(self):
@@ -47,24 +35,60 @@ class SelectAutoDiscoveryServer(GameObject):
 
     def update(self, delta_time):
 
-        # update the listbox contents
-        with self._discovered_servers_lock:
+        # update the listbox contents,
+        # if the discovery found something new
+        snapshot = self._discovery.snapshot
+        if snapshot.version != self._shown_version:
+            self._shown_version = snapshot.version
 
-            # items
+            # items, the fastest servers first
+            servers = sorted(snapshot.servers, key=self._get_sort_key)
             self._server_list_box.items = [
-                ListBoxItem(srv.name, [f"{srv.address}:{srv.port}"], srv)
-                for srv in self._discovered_servers
+                ListBoxItem(srv.name, self._get_server_info(srv), srv,
+                            key=srv.zeroconf_server_name)
+                for srv in servers
             ]
 
             # only make the listbox visible,
             # if there is actually something to show...
-            self._server_list_box_visible = len(self._discovered_servers) > 0
+            self._server_list_box_visible = len(snapshot.servers) > 0
 
         # reposition the list box
         w, h = self.size
         self._server_list_box.position = 0, 0
         self._server_list_box.size = w, h
 
+    @staticmethod
+    def _get_sort_key(srv):
+        # servers without a known ping go last
+        if srv.rtt is None:
+            return 1, 0, srv.name
+        return 0, srv.rtt, srv.name
+
+    def _get_server_info(self, srv):
+        info = [f"{srv.address}:{srv.port}"]
+        if srv.rtt is not None:
+            info[0] += f" - {srv.rtt * 1000:.0f} ms"
+        if srv.protocol_version is not None \
+                and srv.protocol_version != PROTOCOL_VERSION:
+            info.append(f"Incompatible version ({srv.protocol_version})")
+        if srv.players is not None:
+            load = f"{srv.players}"
+            if srv.capacity:
+                load += f"/{srv.capacity}"
+            load += " players"
+            if srv.rooms is not None:
+                load += f", {srv.rooms} rooms"
+            info.append(load)
+        if srv.stale:
+            last_seen = time.strftime(
+                "%Y-%m-%d %H:%M", time.localtime(srv.last_seen))
+            info.append(f"Not found yet - last seen {last_seen}")
+        return info
+
+    def get_render_inputs(self):
+        return self.size, self._server_list_box_visible
+
     def render(self, win):
         w, h = self.size
         win.erase()
@@ -72,7 +96,6 @@ class SelectAutoDiscoveryServer(GameObject):
         colour = get_colour_pair(0, 0, 0, 1, 1, 1)
         win.bkgd(colour)
 
-
         if not self._server_list_box_visible:
             render_text(
                 win, "Searching for servers...", 0, 0, w, h,
@@ -82,37 +105,7 @@ class SelectAutoDiscoveryServer(GameObject):
             )
 
     def start_discovery(self):
-        self._zeroconf = Zeroconf()
-        self._browser = ServiceBrowser(
-            self._zeroconf,
-            "_cac._tcp.local.",
-            handlers=[self.on_service_state_change]
-        )
+        self._discovery.start()
 
     def stop_discovery(self):
-        self.zeroconf.close()
-
-    def on_service_state_change(self, zeroconf,
-                                service_type, name,
-                                state_change):
-        with self._discovered_servers_lock:
-
-            # remove it
-            self._discovered_servers = [
-                server
-                for server in self._discovered_servers
-                if server.zeroconf_server_name != name
-            ]
-
-            # add service
-            if state_change is ServiceStateChange.Added:
-                info = zeroconf.get_service_info(service_type, name)
-                if info:
-                    addr = socket.inet_ntoa(info.address)
-                    port = info.port
-                    zc_name = name
-                    name = "Unnamed Server"
-                    if info.properties and b"name" in info.properties:
-                        name = info.properties[b"name"].decode("utf-8")
-                    self._discovered_servers.append(
-                        Server(name, zc_name, addr, port))
+        self._discovery.stop()
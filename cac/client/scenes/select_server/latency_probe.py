@@ -0,0 +1,161 @@
+"""
+Measures the round trip time to servers in the background.
+
+The probe connects to the game port of the server and measures the
+time from a Ping to its Pong (see cac.protocol.wire). The server answers
+pings without a Hello, so the probes do not count as players.
+"""
+
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cac.protocol import wire
+
+
+class _ProbeState:
+
+    def __init__(self):
+        self.rtt = None
+        self.failures = 0
+        self.next_probe = 0
+        self.in_flight = False
+
+
+class LatencyProbe:
+    """
+    Probes a set of (address, port) targets concurrently and keeps
+    a moving average of the round trip time of each of them.
+
+    Every target is probed every `interval` seconds. Targets, that do
+    not respond, are probed less often: the interval is doubled with
+    every failed probe, up to `max_interval` seconds.
+
+    `on_result(target, rtt)` is called on a worker thread after every
+    probe. `rtt` is the averaged round trip time in seconds,
+    or None, if the target did not respond.
+    """
+
+    def __init__(self, on_result, interval=2, max_interval=60,
+                 timeout=1, smoothing=.3, max_workers=8):
+        self.interval = interval
+        self.max_interval = max_interval
+        self.timeout = timeout
+        self.smoothing = smoothing
+        self._on_result = on_result
+        self._max_workers = max_workers
+        self._states = dict()
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+        self._executor = None
+
+    def start(self):
+        self._running = True
+        self._executor = ThreadPoolExecutor(
+            max_workers=self._max_workers,
+            thread_name_prefix="cac-probe")
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def set_targets(self, targets):
+        """
+        Replaces the set of probed targets.
+        New targets are probed right away.
+        """
+        with self._condition:
+            targets = set(targets)
+            for target in list(self._states):
+                if target not in targets:
+                    del self._states[target]
+            for target in targets:
+                if target not in self._states:
+                    self._states[target] = _ProbeState()
+            self._condition.notify()
+
+    def get_rtt(self, target):
+        """
+        Returns the averaged round trip time of the given target
+        (or None, if it is unknown or the target did not respond).
+        """
+        with self._condition:
+            state = self._states.get(target)
+            return state.rtt if state is not None else None
+
+    def _run(self):
+        with self._condition:
+            while self._running:
+
+                # start all probes, that are due
+                now = time.monotonic()
+                next_probe = now + self.interval
+                for target, state in self._states.items():
+                    if state.in_flight:
+                        continue
+                    if state.next_probe <= now:
+                        state.in_flight = True
+                        self._executor.submit(self._probe, target, state)
+                    else:
+                        next_probe = min(next_probe, state.next_probe)
+
+                # sleep until the next one is due
+                # (or the targets changed)
+                self._condition.wait(next_probe - now)
+
+    def _probe(self, target, state):
+        """
+        Probes a single target. Runs on a worker thread.
+        """
+        try:
+            rtt = self._ping(target)
+        except (OSError, wire.ProtocolError):
+            rtt = None
+
+        with self._condition:
+            state.in_flight = False
+            if rtt is not None:
+                if state.rtt is None:
+                    state.rtt = rtt
+                else:
+                    state.rtt += (rtt - state.rtt) * self.smoothing
+                state.failures = 0
+                state.next_probe = time.monotonic() + self.interval
+            else:
+                state.rtt = None
+                state.failures += 1
+                backoff = self.interval * 2 ** min(state.failures, 16)
+                state.next_probe = \
+                    time.monotonic() + min(backoff, self.max_interval)
+            result = state.rtt
+            removed = self._states.get(target) is not state
+            self._condition.notify()
+
+        if not removed:
+            self._on_result(target, result)
+
+    def _ping(self, target):
+        """
+        Returns the time from a Ping to its Pong in seconds
+        (or None, if the server closed the connection without a Pong).
+        """
+        with socket.create_connection(target, timeout=self.timeout) as sock:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            decoder = wire.FrameDecoder()
+            start = time.perf_counter()
+            sock.sendall(wire.encode(wire.Ping(start)))
+            while True:
+                data = sock.recv(4096)
+                if not data:
+                    return None
+                for message in decoder.feed(data):
+                    if type(message) is wire.Pong:
+                        return time.perf_counter() - start
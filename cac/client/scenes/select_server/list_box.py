@@ -4,6 +4,8 @@ from cac.client.engine.game_object import GameObject
 from cac.client.engine.curses_text import render_text
 from cac.client.engine.curses_colour import get_colour_pair
 from cac.client.engine.events_keyboard import KeyboardEvent
+from cac.client.engine.prefix_sum import PrefixSumIndex
+from cac.client.engine.text_search import NGramIndex
 
 
 class ListBoxItem:
@@ -15,12 +17,23 @@ class ListBoxItem:
         Those lines are rendered in grey below the caption.
      - `data` is an arbitrary object that can be used
        to store the data that is associated to this list box item.
+     - `key` identifies the item, when the items of a list box are
+       replaced: If the selected item is replaced by an item with the
+       same key, the new item is selected. (Optional)
     """
 
-    def __init__(self, caption, info=[], data=None):
+    def __init__(self, caption, info=[], data=None, key=None):
         self.caption = caption
         self.info = info
         self.data = data
+        self.key = key
+
+    @property
+    def height(self):
+        """
+        The number of lines needed to show the item.
+        """
+        return 1 + len(self.info)
 
 
 class ListBox(GameObject):
@@ -55,15 +68,47 @@ class ListBox(GameObject):
 
     The currently selected item can always be accessed using:
      > list_box.selected_item
+
+    For very long lists, create the list box with `virtualised=True`.
+    It then keeps a prefix sum index over the heights of the items,
+    so that rendering only touches the visible items and the cost
+    of a frame does not depend on the length of the list.
+    In this mode, do not modify the list in `items` directly.
+    Either assign a new list (which rebuilds the index) or use
+    append_item(), insert_item(), remove_item() and replace_item(),
+    which update the index incrementally.
+    (The same applies to list boxes, that are being searched.)
+
+    Pressing / starts a search. The typed text filters the list
+    to the items, whose caption or info lines contain it. Enter stops
+    typing, but keeps the filter, Esc clears it. The search uses an
+    n-gram index, that is built when the first search starts.
+    Typing more characters only filters the previous result further.
     """
 
-    def __init__(self):
+    def __init__(self, virtualised=False):
         super().__init__()
 
         # list of ListBoxItem instances
-        self.items = []
+        self._items = []
 
-        # index of the selected list box item
+        # heights of the items (only in virtualised mode)
+        self._virtualised = virtualised
+        self._item_heights = PrefixSumIndex()
+
+        # the items, that are currently shown (and their heights).
+        # these are the same as above, unless there is a search filter.
+        self._view_items = self._items
+        self._view_heights = self._item_heights
+
+        # search
+        self._search_index = None
+        self._item_positions = None
+        self._search_input = False
+        self._search_query = ""
+        self._search_results = []
+
+        # index of the selected list box item (within the shown items)
         self._selected_item_index = 0
 
         # colours
@@ -78,6 +123,135 @@ class ListBox(GameObject):
         self.border_fg_colour = (0, 0, 0)
         self.border_bg_colour = (1, 1, 1)
 
+    @property
+    def items(self):
+        return self._items
+
+    @items.setter
+    def items(self, items):
+        self._items = items
+        if self._virtualised:
+            self._item_heights.rebuild(item.height for item in items)
+        self._search_index = None
+        self._update_view(items_changed=True)
+
+    def append_item(self, item):
+        self.insert_item(len(self._items), item)
+
+    def insert_item(self, index, item):
+        self._items.insert(index, item)
+        if self._virtualised:
+            self._item_heights.insert(index, item.height)
+        if self._search_index is not None:
+            self._search_index.add(item, self._get_search_text(item))
+        self._update_view(items_changed=True)
+
+    def remove_item(self, index):
+        item = self._items.pop(index)
+        if self._virtualised:
+            self._item_heights.remove(index)
+        if self._search_index is not None:
+            self._search_index.remove(item)
+        self._update_view(items_changed=True)
+
+    def replace_item(self, index, item):
+        old_item = self._items[index]
+        self._items[index] = item
+        if self._virtualised:
+            self._item_heights.set(index, item.height)
+        if self._search_index is not None:
+            self._search_index.remove(old_item)
+            self._search_index.add(item, self._get_search_text(item))
+        self._update_view(items_changed=True)
+
+    @property
+    def search_query(self):
+        return self._search_query
+
+    @search_query.setter
+    def search_query(self, query):
+        """
+        Filters the list box to the items containing the query.
+        """
+        if query == self._search_query:
+            return
+
+        # a result for a shorter version of the query narrows
+        # down the candidates - just like the previous keystroke.
+        while self._search_results \
+                and self._search_results[-1][0] not in query:
+            self._search_results.pop()
+        if self._search_results and self._search_results[-1][0] == query:
+            pass
+        elif self._search_results:
+            candidates = self._search_results[-1][1]
+            self._search_results.append(
+                (query, self._get_search_index().refine(candidates, query)))
+        elif query:
+            self._search_results.append((query, self._search(query)))
+
+        self._search_query = query
+        self._update_view()
+
+    def _get_search_text(self, item):
+        return "\n".join([item.caption] + list(item.info))
+
+    def _get_search_index(self):
+        """
+        Returns the search index. It is built on demand.
+        """
+        if self._search_index is None:
+            self._search_index = NGramIndex()
+            for item in self._items:
+                self._search_index.add(item, self._get_search_text(item))
+        return self._search_index
+
+    def _search(self, query):
+        """
+        Searches the index and returns the matching items in list order.
+        """
+        result = self._get_search_index().search(query)
+        if self._item_positions is None:
+            self._item_positions = {
+                item: index for index, item in enumerate(self._items)}
+        return sorted(result, key=self._item_positions.__getitem__)
+
+    def _update_view(self, items_changed=False):
+        """
+        Updates the list of shown items after the items or
+        the search query changed. Keeps the selected item selected.
+        """
+        selected_item = self.selected_item
+        if items_changed:
+            self._item_positions = None
+            self._search_results = []
+
+        if not self._search_query:
+            self._search_results = []
+            self._view_items = self._items
+            self._view_heights = self._item_heights
+        else:
+            # the items changed - so all previous results are outdated
+            if not self._search_results \
+                    or self._search_results[-1][0] != self._search_query:
+                self._search_results = [
+                    (self._search_query, self._search(self._search_query))]
+            self._view_items = self._search_results[-1][1]
+            if self._virtualised:
+                self._view_heights = PrefixSumIndex(
+                    item.height for item in self._view_items)
+
+        if selected_item is None:
+            return
+        if selected_item in self._view_items:
+            self._selected_item_index = \
+                self._view_items.index(selected_item)
+        elif selected_item.key is not None:
+            for index, item in enumerate(self._view_items):
+                if item.key == selected_item.key:
+                    self._selected_item_index = index
+                    break
+
     def get_child_objects(self):
         return []
 
@@ -90,28 +264,53 @@ class ListBox(GameObject):
             ord('j'),
             curses.KEY_DOWN,
         ]
-        if isinstance(event, KeyboardEvent):
-            if event.key_code in up_keys:
-                self._selected_item_index -= 1
-            elif event.key_code in down_keys:
-                self._selected_item_index += 1
+        if not isinstance(event, KeyboardEvent):
+            return
+
+        # typing a search query
+        if self._search_input:
+            if event.key_code == 27:  # esc
+                self._search_input = False
+                self.search_query = ""
+                return
+            elif event.key_code == ord('\n'):
+                self._search_input = False
+                return
+            elif event.key_code in [curses.KEY_BACKSPACE, 127]:
+                if self._search_query == "":
+                    self._search_input = False
+                self.search_query = self._search_query[:-1]
+                return
+            elif ord(' ') <= event.key_code <= ord('~'):
+                self.search_query += chr(event.key_code)
+                return
+            up_keys = [curses.KEY_UP]
+            down_keys = [curses.KEY_DOWN]
+        elif event.key_code == ord('/'):
+            self._search_input = True
+            return
+
+        if event.key_code in up_keys:
+            self._selected_item_index -= 1
+        elif event.key_code in down_keys:
+            self._selected_item_index += 1
 
     def update(self, delta_time):
 
         # Make sure, that self._selected_item_index stays
         # within the valid bounds
 
-        if self._selected_item_index >= len(self.items):
-            self._selected_item_index = len(self.items) - 1
+        if self._selected_item_index >= len(self._view_items):
+            self._selected_item_index = len(self._view_items) - 1
 
         if self._selected_item_index < 0:
             self._selected_item_index = 0
 
     @property
     def selected_item(self):
-        if self._selected_item_index < len(self.items) \
+        if self._selected_item_index < len(self._view_items) \
                 and self._selected_item_index >= 0:
-            return self.items[self._selected_item_index]
+            return self._view_items[self._selected_item_index]
 
     def render(self, win):
         w, h = self.size
@@ -134,11 +333,58 @@ class ListBox(GameObject):
         # background
         win.bkgd(col_text)
 
+        # the last line shows the search query
+        searching = self._search_input or self._search_query != ""
+        list_h = h - 1 if searching else h
+
+        # matches are highlighted using the colours of the
+        # selected items (and the other way round)
+        line_colours = (col_text, col_info, col_text_sel, col_info_sel)
+        highlight_colours = {
+            col_text: col_text_sel,
+            col_info: col_info_sel,
+            col_text_sel: col_info,
+            col_info_sel: col_info,
+        }
+
+        if self._virtualised:
+            visible_lines = self._get_visible_lines_virtualised(
+                list_h, *line_colours)
+        else:
+            visible_lines = self._get_visible_lines(list_h, *line_colours)
+
+        # draw the lines
+        query = self._search_query.lower()
+        for index, (colour, line) in enumerate(visible_lines):
+
+            # draw the text in the chosen colour
+            render_text(win, line, 0, index, w, 1,
+                        text_format=colour, fill_bg=True)
+
+            # highlight the search matches
+            if query:
+                start = line.lower().find(query)
+                while start != -1 and start < w:
+                    render_text(win, line[start:start + len(query)],
+                                start, index, w - start, 1,
+                                text_format=highlight_colours[colour])
+                    start = line.lower().find(query, start + len(query))
+
+        # draw the search query
+        if searching:
+            cursor = "_" if self._search_input else ""
+            render_text(win, f"/{self._search_query}{cursor}",
+                        0, h - 1, w, 1,
+                        text_format=col_info, fill_bg=True)
+
+    def _get_visible_lines(self, h,
+                           col_text, col_info, col_text_sel, col_info_sel):
+
         # create a list of lines for the complete list box
         # and their respective colours
         lines = []
         selected_line = 0
-        for index, item in enumerate(self.items):
+        for index, item in enumerate(self._view_items):
             if index == self._selected_item_index:
                 selected_line = len(lines)
                 this_ite_col_text = col_text_sel
@@ -158,10 +404,37 @@ class ListBox(GameObject):
         if first_line < 0:
             first_line = 0
 
-        # draw the lines
-        visible_lines = lines[first_line:first_line + h]
-        for index, (colour, line) in enumerate(visible_lines):
+        return lines[first_line:first_line + h]
 
-            # draw the text in the chosen colour
-            render_text(win, line, 0, index, w, 1,
-                        text_format=colour, fill_bg=True)
+    def _get_visible_lines_virtualised(
+            self, h, col_text, col_info, col_text_sel, col_info_sel):
+
+        # choose, where to start rendering ("scrolling"),
+        # just like _get_visible_lines() - but using the prefix sums
+        heights = self._view_heights
+        nr_lines = heights.total
+        selected_line = 0
+        if 0 <= self._selected_item_index < len(self._view_items):
+            selected_line = heights.prefix_sum(self._selected_item_index)
+        first_line = selected_line - int(h / 2)
+        if first_line + h - 1 >= nr_lines:
+            first_line = nr_lines - h
+        if first_line < 0:
+            first_line = 0
+
+        # find the first visible item
+        index = heights.find(first_line)
+        skip = first_line - heights.prefix_sum(index)
+
+        # only create the visible lines
+        lines = []
+        while len(lines) < h + skip and index < len(self._view_items):
+            item = self._view_items[index]
+            if index == self._selected_item_index:
+                lines.append((col_text_sel, item.caption))
+                lines.extend([(col_info_sel, info) for info in item.info])
+            else:
+                lines.append((col_text, item.caption))
+                lines.extend([(col_info, info) for info in item.info])
+            index += 1
+        return lines[skip:skip + h]
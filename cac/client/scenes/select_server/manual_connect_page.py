@@ -6,6 +6,7 @@ from cac.client.engine.curses_colour import get_colour_pair
 from cac.client.engine.events import EventPropagation
 from cac.client.engine.events_keyboard import KeyboardEvent
 from cac.client.scenes.select_server.text_box import TextBox
+from cac.protocol.constants import DEFAULT_PORT
 
 
 class ManualConnectForm(GameObject):
@@ -15,7 +16,7 @@ class ManualConnectForm(GameObject):
         self._text_box_address = TextBox()
         self._text_box_address.text = "localhost"
         self._text_box_port = TextBox()
-        self._text_box_port.text = "9852"
+        self._text_box_port.text = str(DEFAULT_PORT)
         self._focused_child = 0
 
     def get_child_objects(self):
@@ -51,6 +52,9 @@ class ManualConnectForm(GameObject):
         for index, text_box_child in enumerate(self.get_child_objects()):
             text_box_child.use_cursor = index == self._focused_child
 
+    def get_render_inputs(self):
+        return self.size
+
     def render(self, win):
         w, h = self.size
         win.erase()
@@ -51,6 +51,26 @@ class SelectServerScene(Scene):
         # help text
         self._help = Label("FOOOOOOO")
 
+        # layout
+        self._page_place = Place(
+            self._shown_page, min_width=80, min_height=24)
+        self._layout = Layers(
+            Place(self._bg),
+            Size(
+                width=.75, height=.75,
+                child = Layers(
+                    Place(self._ui),
+                    Margin(
+                        margin=1, bottom=1,
+                        child = Vertical(0,
+                            self._page_place,
+                            Place(self._help, min_width=60, min_height=1),
+                        )
+                    )
+                )
+            )
+        )
+
 
     def start_scene(self, game):
         self._game = game
@@ -64,6 +84,8 @@ class SelectServerScene(Scene):
         if self._discovery_enabled:
             self._page_autodiscover.stop_discovery()
             self._discovery_enabled = False
+        if self._bg is not None:
+            self._bg.stop()
 
     def get_child_objects(self):
         return [self._bg, self._ui, self._shown_page, self._help]
@@ -92,22 +114,8 @@ class SelectServerScene(Scene):
         self._help.text = f"  <F3>: {f3_text}           <F2>: Run server"
         
         # reposition the children
-        Layers(
-            Place(self._bg),
-            Size(
-                width=.75, height=.75,
-                child = Layers(
-                    Place(self._ui),
-                    Margin(
-                        margin=1, bottom=1,
-                        child = Vertical(0,
-                            Place(self._shown_page, min_width=80, min_height=24),
-                            Place(self._help, min_width=60, min_height=1),
-                        )
-                    )
-                )
-            )
-        ).applyParent(self)
+        self._page_place.child = self._shown_page
+        self._layout.applyParent(self)
 
 
 
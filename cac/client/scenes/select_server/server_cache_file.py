@@ -0,0 +1,104 @@
+"""
+Remembers recently seen servers across restarts of the client,
+so that the server list is not empty while the discovery is running.
+
+Configuration via environment variables:
+
+CAC_SERVER_CACHE_FILE
+            Path of the cache file.
+            Default: $XDG_CACHE_HOME/cards-against-cli/servers.json
+            (or ~/.cache/cards-against-cli/servers.json)
+CAC_SERVER_CACHE_MAX_AGE
+            Servers, that have not been seen for this many seconds,
+            are forgotten. Default: 604800 (one week)
+"""
+
+import json
+import logging
+import os
+import time
+
+_logger = logging.getLogger(__name__)
+
+
+def get_cache_file_path():
+    if "CAC_SERVER_CACHE_FILE" in os.environ:
+        return os.environ["CAC_SERVER_CACHE_FILE"]
+    cache_home = os.environ.get("XDG_CACHE_HOME") or \
+        os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "cards-against-cli", "servers.json")
+
+
+def get_max_age():
+    try:
+        return float(os.environ.get("CAC_SERVER_CACHE_MAX_AGE", 604800))
+    except ValueError:
+        return 604800
+
+
+def is_expired(last_seen):
+    """
+    Whether a server, that was last seen at `last_seen` (as returned by
+    time.time()), is older than the maximum age.
+    """
+    return last_seen < time.time() - get_max_age()
+
+
+def load_servers():
+    """
+    Loads the servers from the cache file.
+    Returns a list of dicts with the keys name, zeroconf_server_name,
+    address, port and last_seen.
+    Returns an empty list, if there is no (valid) cache file.
+    """
+    try:
+        with open(get_cache_file_path(), "r", encoding="utf-8") as f:
+            entries = json.load(f)
+    except (OSError, ValueError):
+        return []
+    if not isinstance(entries, list):
+        return []
+
+    result = []
+    for entry in entries:
+        try:
+            server = dict(name=str(entry["name"]),
+                          zeroconf_server_name=str(
+                              entry["zeroconf_server_name"]),
+                          address=str(entry["address"]),
+                          port=int(entry["port"]),
+                          last_seen=float(entry["last_seen"]))
+        except (KeyError, TypeError, ValueError):
+            continue
+        if not is_expired(server["last_seen"]):
+            result.append(server)
+    return result
+
+
+def save_servers(servers):
+    """
+    Writes the given servers to the cache file.
+    `servers` is a list of objects with the attributes name,
+    zeroconf_server_name, address, port and last_seen.
+    Servers, that are older than the maximum age, are left out.
+    """
+    entries = [
+        dict(name=server.name,
+             zeroconf_server_name=server.zeroconf_server_name,
+             address=server.address,
+             port=server.port,
+             last_seen=server.last_seen)
+        for server in servers
+        if not is_expired(server.last_seen)
+    ]
+
+    # write to a temporary file first, so that a crash
+    # does not leave a half written cache file behind
+    path = get_cache_file_path()
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(entries, f)
+        os.replace(path + ".tmp", path)
+    except OSError:
+        _logger.warning(f"Could not write the server cache to {path}.")
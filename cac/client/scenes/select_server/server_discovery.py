@@ -0,0 +1,319 @@
+"""
+Discovery of Cards Against Cli servers in the local network (via zeroconf).
+"""
+
+import copy
+import logging
+import threading
+import socket
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from zeroconf import ServiceBrowser, ServiceStateChange, Zeroconf
+
+from cac.client.scenes.select_server import server_cache_file
+from cac.client.scenes.select_server.latency_probe import LatencyProbe
+
+_logger = logging.getLogger(__name__)
+
+
+class Server():
+    """
+    A discovered server.
+     - `last_seen` is the time (as returned by time.time()),
+       when the server was discovered.
+     - `stale` is True for servers, that were loaded from the
+       cache file and have not been discovered again, yet.
+     - `players`, `rooms`, `capacity` and `protocol_version` describe
+       the load of the server, as announced by the server.
+       They are None, if the server did not announce them.
+     - `rtt` is the averaged round trip time to the server in seconds
+       (or None, if it is not known or the server does not respond).
+    """
+
+    def __init__(self, name="",
+                 zeroconf_server_name="", address="", port=1337):
+        self.address = address
+        self.name = name
+        self.zeroconf_server_name = zeroconf_server_name
+        self.port = port
+        self.last_seen = time.time()
+        self.stale = False
+        self.players = None
+        self.rooms = None
+        self.capacity = None
+        self.protocol_version = None
+        self.rtt = None
+
+
+ServerListSnapshot = namedtuple("ServerListSnapshot", ["version", "servers"])
+ServerListSnapshot.__doc__ = """
+An immutable state of the list of discovered servers.
+ - `version` is increased with every change of the list.
+ - `servers` is a tuple of Server instances.
+"""
+
+
+def _round_rtt(rtt):
+    return None if rtt is None else round(rtt * 1000)
+
+
+def _get_int_property(properties, key):
+    try:
+        return int(properties[key])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class ServerCache:
+    """
+    Remembers resolved servers by their zeroconf service name
+    for `ttl` seconds, so that services, that disappear and reappear
+    (or are reported multiple times) do not need to be resolved again.
+    """
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._entries = dict()
+
+    def get(self, name):
+        """
+        Returns the cached server or None, if there is no fresh entry.
+        """
+        entry = self._entries.get(name)
+        if entry is None:
+            return None
+        server, resolved_at = entry
+        if time.monotonic() - resolved_at > self.ttl:
+            del self._entries[name]
+            return None
+        return server
+
+    def put(self, name, server):
+        self._entries[name] = server, time.monotonic()
+
+    def remove(self, name):
+        self._entries.pop(name, None)
+
+
+class ServerDiscovery:
+    """
+    Searches for servers in the background.
+
+    The zeroconf threads publish the list of discovered servers as
+    immutable ServerListSnapshot instances in the attribute `snapshot`.
+    Reading the attribute needs no lock, so the game loop can cheaply
+    check every frame, if the version changed since it last looked.
+
+    Services are resolved on a small pool of worker threads, so that
+    a slow service does not block the discovery of the others.
+    The snapshot is updated as soon as each of them is resolved.
+
+    If `persist` is set, the servers seen in earlier sessions are loaded
+    from a cache file on start() and shown right away, marked as stale.
+    They are replaced, once they are discovered again, and removed, once
+    they are older than the maximum age of the cache file (checked
+    whenever they are pinged).
+    On stop(), all known servers are written back to the cache file.
+
+    All servers in the list are pinged in the background (see
+    LatencyProbe), and a new snapshot is published, whenever the round
+    trip time to one of them changes.
+    """
+
+    def __init__(self, max_resolvers=4, cache_ttl=60, persist=False):
+        self.snapshot = ServerListSnapshot(0, ())
+        self._persist = persist
+
+        # only used by the zeroconf and resolver threads
+        self._servers = dict()
+        self._cache = ServerCache(cache_ttl)
+        self._pending = dict()
+        self._lock = threading.Lock()
+        self._max_resolvers = max_resolvers
+        self._executor = None
+        self._stopped = False
+        self._zeroconf = None
+        self._browser = None
+        self._probe = LatencyProbe(self._on_probe_result)
+
+    def start(self):
+
+        # show the servers of the last sessions
+        if self._persist:
+            with self._lock:
+                for entry in server_cache_file.load_servers():
+                    server = Server(entry["name"],
+                                    entry["zeroconf_server_name"],
+                                    entry["address"], entry["port"])
+                    server.last_seen = entry["last_seen"]
+                    server.stale = True
+                    self._servers[server.zeroconf_server_name] = server
+                self._publish()
+
+        # zeroconf is the most likely to fail (e.g. without a network),
+        # so it is created before any threads are started
+        self._zeroconf = Zeroconf()
+        try:
+            self._probe.start()
+            self._executor = ThreadPoolExecutor(
+                max_workers=self._max_resolvers,
+                thread_name_prefix="cac-resolve")
+            self._browser = ServiceBrowser(
+                self._zeroconf,
+                "_cac._tcp.local.",
+                handlers=[self.on_service_state_change]
+            )
+        except BaseException:
+            # nobody calls stop() after a failed start()
+            self.stop()
+            raise
+
+    def stop(self):
+        # zeroconf may still report services, until it is closed
+        with self._lock:
+            self._stopped = True
+        if self._zeroconf is not None:
+            self._zeroconf.close()
+            self._zeroconf = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        self._probe.stop()
+        if self._persist:
+            with self._lock:
+                servers = list(self._servers.values())
+            server_cache_file.save_servers(servers)
+
+    def _publish(self):
+        """
+        Replaces the snapshot by the current list of servers.
+        Must be called with the lock held.
+        """
+        self._remove_expired()
+        self.snapshot = ServerListSnapshot(
+            self.snapshot.version + 1, tuple(self._servers.values()))
+        self._probe.set_targets(
+            (server.address, server.port)
+            for server in self._servers.values())
+
+    def _on_probe_result(self, target, rtt):
+        """
+        Called by the latency probe. Runs on a worker thread.
+        """
+        with self._lock:
+            changed = self._remove_expired()
+            for name, server in list(self._servers.items()):
+                if (server.address, server.port) != target or \
+                        server.rtt == rtt:
+                    continue
+                # the published servers must not change, so the server
+                # is replaced by a copy. only changes, that are visible
+                # in the list (whole milliseconds) are published.
+                if _round_rtt(server.rtt) != _round_rtt(rtt):
+                    changed = True
+                server = copy.copy(server)
+                server.rtt = rtt
+                self._servers[name] = server
+            if changed:
+                self._publish()
+
+    def on_service_state_change(self, zeroconf,
+                                service_type, name,
+                                state_change):
+        with self._lock:
+            if self._stopped:
+                return
+
+            # the service is gone. servers also unregister their
+            # services to change the load in the TXT record, so
+            # a service, that comes back, has to be resolved again.
+            if state_change is ServiceStateChange.Removed:
+                self._pending.pop(name, None)
+                self._cache.remove(name)
+                if self._servers.pop(name, None) is not None:
+                    self._publish()
+                return
+
+            # a recently resolved service does not need to be resolved again
+            if state_change is ServiceStateChange.Added:
+                server = self._cache.get(name)
+                if server is not None:
+                    self._servers[name] = server
+                    self._publish()
+                    return
+
+            # resolve it in the background.
+            # the token makes sure, that only the latest
+            # resolve for a service is used.
+            token = object()
+            self._pending[name] = token
+            # (stop() shuts the executor down after setting _stopped)
+            self._executor.submit(
+                self._resolve, zeroconf, service_type, name, token)
+
+    def _resolve(self, zeroconf, service_type, name, token):
+        """
+        Resolves a service. Runs on a worker thread.
+        """
+        server = None
+        try:
+            server = self._get_server(zeroconf, service_type, name)
+        except Exception:
+            _logger.exception(f"Resolving {name} failed.")
+        finally:
+            with self._lock:
+                # not removed or resolved again in the meantime
+                if self._pending.get(name) is token:
+                    del self._pending[name]
+                    if server is not None:
+                        self._cache.put(name, server)
+                        self._remove_stale_duplicates(server)
+                        self._servers[name] = server
+                        self._publish()
+
+    def _get_server(self, zeroconf, service_type, name):
+        info = zeroconf.get_service_info(service_type, name)
+        if not info:
+            return None
+        addr = socket.inet_ntoa(info.address)
+        port = info.port
+        properties = info.properties or dict()
+        server_name = "Unnamed Server"
+        if b"name" in properties:
+            server_name = properties[b"name"].decode("utf-8")
+        server = Server(server_name, name, addr, port)
+        server.players = _get_int_property(properties, b"players")
+        server.rooms = _get_int_property(properties, b"rooms")
+        server.capacity = _get_int_property(properties, b"capacity")
+        server.protocol_version = _get_int_property(properties, b"proto")
+        server.rtt = self._probe.get_rtt((addr, port))
+        return server
+
+    def _remove_expired(self):
+        """
+        Removes the stale servers, that are too old to be kept.
+        Returns whether any were removed.
+        Must be called with the lock held.
+        """
+        expired = [name for name, server in self._servers.items()
+                   if server.stale
+                   and server_cache_file.is_expired(server.last_seen)]
+        for name in expired:
+            del self._servers[name]
+        return bool(expired)
+
+    def _remove_stale_duplicates(self, server):
+        """
+        Servers get a new service name whenever they are restarted,
+        so a stale entry is replaced by any server with the same address.
+        Must be called with the lock held.
+        """
+        self._servers = {
+            name: other
+            for name, other in self._servers.items()
+            if not (other.stale
+                    and other.address == server.address
+                    and other.port == server.port)
+        }
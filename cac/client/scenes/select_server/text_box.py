@@ -4,19 +4,27 @@ from cac.client.engine.game_object import GameObject
 from cac.client.engine.curses_text import render_text
 from cac.client.engine.curses_colour import get_colour_pair
 from cac.client.engine.events_keyboard import KeyboardEvent
+from cac.client.engine.gap_buffer import GapBuffer
 
 
 class TextBox(GameObject):
     """
     Text box ui component.
     A text field where the user can enter Text.
+
+    The text is stored in a gap buffer, so typing is cheap even
+    for long texts. Reading the `text` attribute converts it to a str.
     """
 
     def __init__(self):
         super().__init__()
 
         # The text that the user entered
-        self.text = ""
+        self._buffer = GapBuffer()
+
+        # Printable keys of the current input batch, that are
+        # inserted into the buffer at once (see _flush_pending_text())
+        self._pending_text = []
 
         # The index of the character where the cursor is.
         self.cursor_pos = 0
@@ -30,46 +38,72 @@ class TextBox(GameObject):
         self.cursor_fg_colour = (1, 1, 1)
         self.cursor_bg_colour = (0, 0, 0)
 
+    @property
+    def text(self):
+        self._flush_pending_text()
+        return str(self._buffer)
+
+    @text.setter
+    def text(self, value):
+        self._pending_text = []
+        self._buffer = GapBuffer(value)
+
+    def insert_text(self, text):
+        """
+        Inserts the given text (e.g. pasted text) at the cursor.
+        """
+        self._clamp_cursor()
+        self._buffer.insert(self.cursor_pos, text)
+        self.cursor_pos += len(text)
+
+    def _flush_pending_text(self):
+        # insert the collected printable keys with a single insert
+        if self._pending_text:
+            text = "".join(self._pending_text)
+            self._pending_text = []
+            self.insert_text(text)
+
+    def _clamp_cursor(self):
+        # make sure the cursor position is valid:
+        if self.cursor_pos < 0:
+            self.cursor_pos = 0
+        if self.cursor_pos > len(self._buffer):
+            self.cursor_pos = len(self._buffer)
+
     def get_child_objects(self):
         return []
 
     def process_event(self, event):
         if isinstance(event, KeyboardEvent):
 
-            # make sure the cursor position is valid:
-            if self.cursor_pos < 0:
-                self.cursor_pos = 0
-            if self.cursor_pos > len(self.text):
-                self.cursor_pos = len(self.text)
-
-            # printable characters
+            # printable characters are collected until the end of
+            # the input batch (or until the next non-printable key)
             if event.key_code >= ord(' ') and event.key_code <= ord('~'):
-                self.text = self.text[:self.cursor_pos] + \
-                    chr(event.key_code) + \
-                    self.text[self.cursor_pos:]
-                self.cursor_pos += 1
+                self._pending_text.append(chr(event.key_code))
+                return
+
+            self._flush_pending_text()
+            self._clamp_cursor()
 
             # arrow keys
             if event.key_code == curses.KEY_LEFT:
                 self.cursor_pos = max(0, self.cursor_pos - 1)
             if event.key_code == curses.KEY_RIGHT:
-                self.cursor_pos = min(len(self.text), self.cursor_pos + 1)
+                self.cursor_pos = min(len(self._buffer), self.cursor_pos + 1)
 
             # backspace
             if event.key_code in [curses.KEY_BACKSPACE, 127]:
                 if self.cursor_pos > 0:
-                    self.text = self.text[:self.cursor_pos - 1] + \
-                        self.text[self.cursor_pos:]
+                    self._buffer.delete(self.cursor_pos - 1)
                     self.cursor_pos -= 1
 
             # del
             if event.key_code == curses.KEY_DC:
-                if self.cursor_pos < len(self.text):
-                    self.text = self.text[:self.cursor_pos] + \
-                        self.text[self.cursor_pos + 1:]
+                if self.cursor_pos < len(self._buffer):
+                    self._buffer.delete(self.cursor_pos)
 
     def update(self, delta_time):
-        pass
+        self._flush_pending_text()
 
     def render(self, win):
         w, h = self.size
@@ -85,7 +119,8 @@ class TextBox(GameObject):
         col_text = get_colour_pair(
             self.fg_colour,
             self.bg_colour)
-        col_cursor = get_colour_pair(self.cursor_fg_colour, self.cursor_bg_colour)
+        col_cursor = get_colour_pair(
+            self.cursor_fg_colour, self.cursor_bg_colour)
 
         # calculate the positions
         text_w = w
@@ -97,13 +132,16 @@ class TextBox(GameObject):
             cursor_position = text_w - 1
 
         # draw the text
+        # (only the visible part, the buffer is not converted to a str)
         render_text(
-            win, self.text[start_char:], 0, 0, text_w, 1,
+            win, self._buffer.substring(start_char, start_char + text_w),
+            0, 0, text_w, 1,
             text_format=col_text
         )
 
         # draw the cursor
-        char_under_cursor = (self.text + ' ')[self.cursor_pos]
+        char_under_cursor = \
+            self._buffer.substring(self.cursor_pos, self.cursor_pos + 1) or ' '
         if self.use_cursor:
             render_text(
                 win, char_under_cursor, cursor_position, 0, 1, 1,
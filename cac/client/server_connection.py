@@ -0,0 +1,183 @@
+"""
+The connection of a client to a Cards Against Cli server.
+
+Headless (no curses involved), so it is used by the game as well as
+by bots and load tests.
+"""
+
+import asyncio
+import logging
+import time
+
+from cac.protocol import wire
+from cac.protocol.constants import PROTOCOL_VERSION
+from cac.protocol.room_state import RoomState, SequenceGap
+
+_logger = logging.getLogger(__name__)
+
+READ_SIZE = 64 * 1024
+
+
+class ServerError(Exception):
+    """
+    The server answered with an Error message.
+    """
+
+    def __init__(self, error):
+        super().__init__(error.message)
+        self.code = error.code
+
+
+class ServerConnection:
+    """
+    Talks to a server using asyncio.
+
+    The current state of the room, that the player is in, is kept up
+    to date in `room_state`. `on_message(message)` is called for every
+    received message, after the state was updated.
+    """
+
+    def __init__(self, player_name):
+        self.player_name = player_name
+        self.player = None
+        self.server_name = None
+        self.room_state = None
+        self.on_message = None
+        self.messages_sent = 0
+        self.messages_received = 0
+
+        self._reader = None
+        self._writer = None
+        self._receive_task = None
+        self._decoder = wire.FrameDecoder()
+        self._welcome = None
+        self._snapshot = None
+        self._stats = None
+        self._pings = dict()
+        self._resyncing = False
+
+    async def connect(self, host, port):
+        """
+        Connects and says hello. Raises a ServerError, if the server
+        does not accept the client (e.g. because of another protocol
+        version).
+        """
+        self._reader, self._writer = await asyncio.open_connection(
+            host, port, limit=READ_SIZE)
+        self._receive_task = asyncio.ensure_future(self._receive())
+        self._welcome = asyncio.get_event_loop().create_future()
+        self.send(wire.Hello(PROTOCOL_VERSION, self.player_name))
+        await self._welcome
+
+    def close(self):
+        if self._receive_task is not None:
+            self._receive_task.cancel()
+            self._receive_task = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def send(self, message):
+        self._writer.write(wire.encode(message))
+        self.messages_sent += 1
+
+    async def join_room(self, room):
+        """
+        Joins a room and waits for its state.
+        """
+        self._snapshot = asyncio.get_event_loop().create_future()
+        self.send(wire.JoinRoom(room))
+        await self._snapshot
+
+    def leave_room(self):
+        self.room_state = None
+        self.send(wire.LeaveRoom())
+
+    def play_card(self, card):
+        self.send(wire.PlayCard(card))
+
+    def vote(self, player):
+        self.send(wire.Vote(player))
+
+    async def ping(self):
+        """
+        Returns the round trip time to the server in seconds.
+        """
+        timestamp = time.perf_counter()
+        future = asyncio.get_event_loop().create_future()
+        self._pings[timestamp] = future
+        self.send(wire.Ping(timestamp))
+        await future
+        return time.perf_counter() - timestamp
+
+    async def request_stats(self):
+        """
+        Returns the Stats of the server.
+        """
+        self._stats = asyncio.get_event_loop().create_future()
+        self.send(wire.RequestStats())
+        return await self._stats
+
+    async def _receive(self):
+        try:
+            while True:
+                data = await self._reader.read(READ_SIZE)
+                if not data:
+                    break
+                messages = self._decoder.feed(data)
+                self.messages_received += len(messages)
+                for message in messages:
+                    self._handle(message)
+                    if self.on_message is not None:
+                        self.on_message(message)
+        except (ConnectionError, wire.ProtocolError) as e:
+            _logger.warning(f"Connection lost: {e}")
+            error = e
+        else:
+            error = ConnectionError("Connection closed by the server.")
+
+        # nobody waits forever
+        for future in [self._welcome, self._snapshot, self._stats,
+                       *self._pings.values()]:
+            if future is not None and not future.done():
+                future.set_exception(error)
+
+    def _handle(self, message):
+        message_type = type(message)
+        if message_type is wire.RoomDelta:
+            if self.room_state is None:
+                return
+            try:
+                self.room_state.apply_delta(message)
+            except SequenceGap:
+                # missed something, start over with a new snapshot
+                if not self._resyncing:
+                    self._resyncing = True
+                    self.send(wire.RequestSnapshot())
+        elif message_type is wire.Pong:
+            future = self._pings.pop(message.timestamp, None)
+            if future is not None and not future.done():
+                future.set_result(message.timestamp)
+        elif message_type is wire.RoomSnapshot:
+            self._resyncing = False
+            self.room_state = RoomState.from_snapshot(message)
+            _resolve(self._snapshot, message)
+        elif message_type is wire.Welcome:
+            self.player = message.player
+            self.server_name = message.server_name
+            _resolve(self._welcome, message)
+        elif message_type is wire.Stats:
+            _resolve(self._stats, message)
+        elif message_type is wire.Error:
+            # the error belongs to whatever is waited for
+            for future in (self._welcome, self._snapshot, self._stats):
+                if future is not None and not future.done():
+                    future.set_exception(ServerError(message))
+                    break
+            else:
+                _logger.warning(f"Server error: {message.message}")
+
+
+def _resolve(future, result):
+    if future is not None and not future.done():
+        future.set_result(result)
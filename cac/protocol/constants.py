@@ -0,0 +1,10 @@
+"""
+Constants shared by the Cards Against Cli server and client.
+"""
+
+# version of the network protocol.
+# clients and servers with different versions can not play together.
+PROTOCOL_VERSION = 1
+
+# the port, that the server listens on by default
+DEFAULT_PORT = 9852
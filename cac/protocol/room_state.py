@@ -0,0 +1,151 @@
+"""
+The state of a room, as it is synchronised between server and clients.
+
+The server changes the state using the methods of RoomState. Every
+change is recorded as a delta operation. take_delta() collects them
+into a single RoomDelta message (e.g. once per tick), so that the
+clients only receive what changed.
+
+The clients start with the RoomSnapshot, that they receive on joining
+the room, and apply the deltas with apply_delta().
+"""
+
+from cac.protocol import wire
+
+
+class SequenceGap(Exception):
+    """
+    A delta was missed. A new snapshot has to be requested.
+    """
+    pass
+
+
+class RoomState:
+
+    def __init__(self, room=""):
+        self.room = room
+        self.sequence = 0
+        self.round = 0
+        self.czar = 0
+        self.black_card = 0
+        # player id -> [name, score]
+        self.players = dict()
+        # player id -> card
+        self.played = dict()
+
+        # changes since the last delta
+        self._ops = []
+        self._names = []
+
+    # --- server side ---
+
+    def add_player(self, player, name):
+        self.players[player] = [name, 0]
+        self._ops.append((wire.OP_PLAYER_JOINED, player, len(self._names)))
+        self._names.append(name)
+
+    def remove_player(self, player):
+        if self.players.pop(player, None) is None:
+            return
+        self.played.pop(player, None)
+        self._ops.append((wire.OP_PLAYER_LEFT, player, 0))
+
+    def set_score(self, player, score):
+        self.players[player][1] = score
+        self._ops.append((wire.OP_SCORE, player, score))
+
+    def play_card(self, player, card):
+        self.played[player] = card
+        self._ops.append((wire.OP_CARD_PLAYED, player, card))
+
+    def new_round(self, black_card):
+        self.round += 1
+        self.black_card = black_card
+        self.played.clear()
+        self._ops.append((wire.OP_NEW_ROUND, self.round, black_card))
+
+    def set_czar(self, player):
+        self.czar = player
+        self._ops.append((wire.OP_CZAR, player, 0))
+
+    def has_changes(self):
+        return len(self._ops) > 0
+
+    def take_delta(self):
+        """
+        Returns a RoomDelta with all changes since the last call
+        (or None, if nothing changed).
+        """
+        if not self._ops:
+            return None
+        self.sequence += 1
+        delta = wire.RoomDelta(self.sequence, self._ops, self._names)
+        self._ops = []
+        self._names = []
+        return delta
+
+    def snapshot(self):
+        """
+        Returns a RoomSnapshot of the current state.
+        Changes, that were not taken as delta yet, are included
+        in the snapshot, but not in its sequence number, so pending
+        changes should be taken before creating a snapshot.
+        """
+        ids = list(self.players.keys())
+        return wire.RoomSnapshot(
+            self.sequence, self.round, self.czar, self.black_card,
+            self.room,
+            ids,
+            [self.players[player][1] for player in ids],
+            [self.players[player][0] for player in ids],
+            list(self.played.items()))
+
+    # --- client side ---
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        state = cls(snapshot.room)
+        state.load_snapshot(snapshot)
+        return state
+
+    def load_snapshot(self, snapshot):
+        self.room = snapshot.room
+        self.sequence = snapshot.sequence
+        self.round = snapshot.round
+        self.czar = snapshot.czar
+        self.black_card = snapshot.black_card
+        self.players = {
+            player: [name, score]
+            for player, name, score in zip(snapshot.player_ids,
+                                           snapshot.player_names,
+                                           snapshot.player_scores)}
+        self.played = dict(snapshot.played)
+
+    def apply_delta(self, delta):
+        """
+        Applies a RoomDelta.
+        Old deltas are ignored. Raises a SequenceGap, if a delta is missing.
+        """
+        if delta.sequence <= self.sequence:
+            return
+        if delta.sequence != self.sequence + 1:
+            raise SequenceGap(
+                f"Expected delta {self.sequence + 1}, got {delta.sequence}.")
+        for op, a, b in delta.ops:
+            if op == wire.OP_PLAYER_JOINED:
+                self.players[a] = [delta.names[b], 0]
+            elif op == wire.OP_PLAYER_LEFT:
+                self.players.pop(a, None)
+                self.played.pop(a, None)
+            elif op == wire.OP_SCORE:
+                if a in self.players:
+                    self.players[a][1] = b
+            elif op == wire.OP_CARD_PLAYED:
+                self.played[a] = b
+            elif op == wire.OP_NEW_ROUND:
+                self.round = a
+                self.black_card = b
+                self.played.clear()
+            elif op == wire.OP_CZAR:
+                self.czar = a
+        self.sequence = delta.sequence
@@ -0,0 +1,380 @@
+"""
+The binary wire format, that the client and the server talk.
+
+Every message is sent as a frame:
+
+    length (uint32) | message type (uint8) | body
+
+`length` counts the message type and the body. All numbers are sent in
+network byte order. The body of each message type is described by a
+schema (see the message definitions at the end of this module), which
+is compiled into a few struct.Struct instances, so that encoding and
+decoding mostly happens in C:
+
+ - fixed size fields ("B", "H", "I", "Q", "i", "d", ...) are packed
+   together, consecutive ones with a single struct call.
+ - "str" is an utf-8 string, prefixed with its length (uint16).
+ - "str*" is a list of strings: the number of strings (uint32) and
+   the length of the data (uint32), followed by the strings as utf-8,
+   separated by zero bytes. (so the strings must not contain "\\0",
+   but the list can be decoded at once)
+ - a list (e.g. ["I"] or ["BII"]) is a list of fixed size records,
+   prefixed with the number of records (uint32). Records with a single
+   field are plain values, otherwise tuples.
+
+The first message of a connection is Hello, which carries the
+PROTOCOL_VERSION of the client. A server, that speaks another version,
+answers with an Error and closes the connection. Whenever the schema
+of a message changes, PROTOCOL_VERSION has to be increased.
+
+Rooms are synchronised with a RoomSnapshot, which contains the complete
+state of the room, followed by RoomDelta messages with only the
+changes. Every delta has a sequence number. A client, that misses a
+delta, asks for a new snapshot using RequestSnapshot.
+(see cac.protocol.room_state)
+"""
+
+import struct
+from collections import namedtuple
+
+# frames larger than this are considered an error
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+
+_FRAME_HEADER = struct.Struct("!IB")
+_LENGTH = struct.Struct("!I")
+_STR_LENGTH = struct.Struct("!H")
+_COUNT = struct.Struct("!I")
+_STR_LIST_HEADER = struct.Struct("!II")
+
+
+class ProtocolError(Exception):
+    """
+    Raised for data, that does not follow the protocol.
+    """
+    pass
+
+
+class _Codec:
+    """
+    Encodes and decodes the body of a message type using its schema.
+    """
+
+    def __init__(self, fields):
+        # compile the schema into steps of (kind, struct, number of fields).
+        # consecutive fixed size fields are merged into one struct.
+        self._steps = []
+        fixed_format = ""
+        fixed_count = 0
+        for name, kind in fields:
+            if isinstance(kind, str) and kind not in ("str", "str*"):
+                fixed_format += kind
+                fixed_count += 1
+                continue
+            if fixed_format:
+                self._steps.append(
+                    ("fixed", struct.Struct("!" + fixed_format), fixed_count))
+                fixed_format = ""
+                fixed_count = 0
+            if isinstance(kind, str):
+                self._steps.append((kind, None, 1))
+            else:
+                record = struct.Struct("!" + kind[0])
+                self._steps.append(("list", record, len(kind[0])))
+        if fixed_format:
+            self._steps.append(
+                ("fixed", struct.Struct("!" + fixed_format), fixed_count))
+
+    def encode(self, message):
+        parts = []
+        index = 0
+        for kind, record, count in self._steps:
+            if kind == "fixed":
+                parts.append(record.pack(*message[index:index + count]))
+                index += count
+                continue
+            value = message[index]
+            index += 1
+            if kind == "str":
+                parts.append(_encode_str(value))
+            elif kind == "str*":
+                parts.append(_encode_str_list(value))
+            elif count == 1:
+                # a list of plain values is packed with a single call
+                parts.append(_COUNT.pack(len(value)))
+                parts.append(struct.pack(
+                    f"!{len(value)}{record.format[1:]}", *value))
+            else:
+                parts.append(_COUNT.pack(len(value)))
+                parts.extend(record.pack(*item) for item in value)
+        return b"".join(parts)
+
+    def decode(self, data, offset, end):
+        values = []
+        try:
+            for kind, record, count in self._steps:
+                if kind == "fixed":
+                    values.extend(record.unpack_from(data, offset))
+                    offset += record.size
+                elif kind == "str":
+                    string, offset = _decode_str(data, offset, end)
+                    values.append(string)
+                elif kind == "str*":
+                    strings, offset = _decode_str_list(data, offset, end)
+                    values.append(strings)
+                else:
+                    items, = _COUNT.unpack_from(data, offset)
+                    offset += _COUNT.size
+                    size = items * record.size
+                    if offset + size > end:
+                        raise ProtocolError("Truncated list.")
+                    if count == 1:
+                        values.append(list(struct.unpack_from(
+                            f"!{items}{record.format[1:]}", data, offset)))
+                    else:
+                        values.append(list(record.iter_unpack(
+                            data[offset:offset + size])))
+                    offset += size
+        except struct.error as e:
+            raise ProtocolError(f"Truncated message: {e}")
+        if offset != end:
+            raise ProtocolError("Unexpected data at the end of a message.")
+        return values
+
+
+def _encode_str(string):
+    data = string.encode("utf-8")
+    if len(data) > 0xffff:
+        raise ProtocolError("String too long.")
+    return _STR_LENGTH.pack(len(data)) + data
+
+
+def _decode_str(data, offset, end):
+    length, = _STR_LENGTH.unpack_from(data, offset)
+    offset += _STR_LENGTH.size
+    if offset + length > end:
+        raise ProtocolError("Truncated string.")
+    try:
+        string = str(data[offset:offset + length], "utf-8")
+    except UnicodeDecodeError:
+        raise ProtocolError("Invalid utf-8 string.")
+    return string, offset + length
+
+
+def _encode_str_list(strings):
+    text = "\0".join(strings)
+    if text.count("\0") != max(0, len(strings) - 1):
+        raise ProtocolError("Strings in lists must not contain \\0.")
+    data = text.encode("utf-8")
+    return _STR_LIST_HEADER.pack(len(strings), len(data)) + data
+
+
+def _decode_str_list(data, offset, end):
+    count, length = _STR_LIST_HEADER.unpack_from(data, offset)
+    offset += _STR_LIST_HEADER.size
+    if offset + length > end:
+        raise ProtocolError("Truncated string list.")
+    try:
+        text = str(data[offset:offset + length], "utf-8")
+    except UnicodeDecodeError:
+        raise ProtocolError("Invalid utf-8 string.")
+    strings = text.split("\0") if count else []
+    if len(strings) != count:
+        raise ProtocolError("Invalid string list.")
+    return strings, offset + length
+
+
+# message type id -> (message class, codec)
+_MESSAGE_TYPES = dict()
+# message class -> (message type id, codec)
+_MESSAGE_CLASSES = dict()
+
+
+def _message(type_id, name, fields, doc):
+    """
+    Defines a message type.
+    The messages are namedtuples with the fields of the schema.
+    """
+    message_class = namedtuple(name, [field for field, kind in fields])
+    message_class.__doc__ = doc
+    codec = _Codec(fields)
+    assert type_id not in _MESSAGE_TYPES
+    _MESSAGE_TYPES[type_id] = message_class, codec
+    _MESSAGE_CLASSES[message_class] = type_id, codec
+    return message_class
+
+
+def encode(message):
+    """
+    Encodes a message into a complete frame.
+    """
+    type_id, codec = _MESSAGE_CLASSES[type(message)]
+    body = codec.encode(message)
+    if len(body) + 1 > MAX_FRAME_SIZE:
+        raise ProtocolError("Message too large.")
+    return _FRAME_HEADER.pack(len(body) + 1, type_id) + body
+
+
+def decode(frame):
+    """
+    Decodes a single complete frame (as returned by encode()).
+    """
+    messages = list(FrameDecoder().feed(frame))
+    if len(messages) != 1:
+        raise ProtocolError("Expected exactly one message.")
+    return messages[0]
+
+
+class FrameDecoder:
+    """
+    Splits a stream of bytes into messages.
+
+    Data is fed in whatever chunks it arrives in. Complete messages are
+    decoded right away, the rest is kept until more data arrives.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def feed(self, data):
+        """
+        Adds received data and returns the list of complete messages.
+        Raises a ProtocolError for invalid data.
+        """
+        buffer = self._buffer
+        buffer += data
+        messages = []
+        offset = 0
+        end = len(buffer)
+        while end - offset >= _FRAME_HEADER.size:
+            length, type_id = _FRAME_HEADER.unpack_from(buffer, offset)
+            if length == 0 or length > MAX_FRAME_SIZE:
+                raise ProtocolError(f"Invalid frame length {length}.")
+            frame_end = offset + _LENGTH.size + length
+            if frame_end > end:
+                break
+            if type_id not in _MESSAGE_TYPES:
+                raise ProtocolError(f"Unknown message type {type_id}.")
+            message_class, codec = _MESSAGE_TYPES[type_id]
+            body = memoryview(buffer)[:frame_end]
+            try:
+                values = codec.decode(
+                    body, offset + _FRAME_HEADER.size, frame_end)
+            finally:
+                body.release()
+            messages.append(message_class._make(values))
+            offset = frame_end
+
+        # only drop the consumed data once per call
+        if offset:
+            del buffer[:offset]
+        return messages
+
+    def take_pending(self):
+        """
+        Returns the data of incomplete messages and forgets it.
+        """
+        pending = bytes(self._buffer)
+        self._buffer.clear()
+        return pending
+
+
+# -----------------------------------------------------------------------------
+# Messages
+# -----------------------------------------------------------------------------
+
+# client -> server
+
+Hello = _message(1, "Hello", [
+    ("protocol_version", "H"),
+    ("player_name", "str"),
+], "First message of every connection.")
+
+JoinRoom = _message(2, "JoinRoom", [
+    ("room", "str"),
+], "Joins a room (which is created, if it does not exist).")
+
+LeaveRoom = _message(3, "LeaveRoom", [
+], "Leaves the current room.")
+
+PlayCard = _message(4, "PlayCard", [
+    ("card", "I"),
+], "Plays a white card in the current round.")
+
+Vote = _message(5, "Vote", [
+    ("player", "I"),
+], "Votes for the card, that the given player played.")
+
+RequestSnapshot = _message(6, "RequestSnapshot", [
+], "Asks for a new RoomSnapshot (e.g. after a missed delta).")
+
+# both directions
+
+Ping = _message(10, "Ping", [
+    ("timestamp", "d"),
+], "Asks the other side to answer with a Pong.")
+
+Pong = _message(11, "Pong", [
+    ("timestamp", "d"),
+], "Answer to a Ping, with the timestamp of the Ping.")
+
+# server -> client
+
+Welcome = _message(20, "Welcome", [
+    ("player", "I"),
+    ("server_name", "str"),
+], "Answer to Hello, with the id of the player.")
+
+Error = _message(21, "Error", [
+    ("code", "H"),
+    ("message", "str"),
+], "Something went wrong. See the ERROR_* constants.")
+
+RoomSnapshot = _message(22, "RoomSnapshot", [
+    ("sequence", "I"),
+    ("round", "I"),
+    ("czar", "I"),
+    ("black_card", "I"),
+    ("room", "str"),
+    ("player_ids", ["I"]),
+    ("player_scores", ["I"]),
+    ("player_names", "str*"),
+    ("played", ["II"]),
+], """
+The complete state of a room.
+`played` is a list of (player, card) tuples.
+""")
+
+RoomDelta = _message(23, "RoomDelta", [
+    ("sequence", "I"),
+    ("ops", ["BII"]),
+    ("names", "str*"),
+], """
+Changes of a room since the previous sequence number.
+`ops` is a list of (op, a, b) tuples, see the OP_* constants.
+""")
+
+Stats = _message(24, "Stats", [
+    ("players", "I"),
+    ("rooms", "I"),
+    ("messages_in", "Q"),
+    ("messages_out", "Q"),
+    ("bytes_in", "Q"),
+    ("bytes_out", "Q"),
+], "Load statistics of the server.")
+
+RequestStats = _message(25, "RequestStats", [
+], "Asks the server for its Stats.")
+
+# error codes
+ERROR_VERSION_MISMATCH = 1
+ERROR_NOT_IN_ROOM = 2
+ERROR_INVALID_MESSAGE = 3
+ERROR_SERVER_FULL = 4
+
+# delta operations
+OP_PLAYER_JOINED = 1  # a: player, b: index of the name in `names`
+OP_PLAYER_LEFT = 2  # a: player
+OP_SCORE = 3  # a: player, b: new score
+OP_CARD_PLAYED = 4  # a: player, b: card
+OP_NEW_ROUND = 5  # a: round, b: black card (all played cards are removed)
+OP_CZAR = 6  # a: player
@@ -11,54 +11,359 @@ on which interface(s) the service should be announced.
 Example:
 export CAC_ANNOUNCE_INTERFACES=lo,wlp4s0
 
+The interfaces are checked for changes every CAC_INTERFACE_POLL_INTERVAL
+seconds (default: 5). Set it to 0 to disable the monitoring.
+
 """
 
 from zeroconf import ServiceInfo, Zeroconf
+from concurrent.futures import ThreadPoolExecutor
+from collections import namedtuple
 import socket
+import threading
+import time
 import logging
 import netifaces
 import os
 import uuid
 
+from cac.protocol.constants import PROTOCOL_VERSION
+
 _logger = logging.getLogger(__name__)
 
+SERVICE_TYPE = "_cac._tcp.local."
+
+
+_Registration = namedtuple("_Registration", ["service", "address"])
+
+
+class Announcer:
+    """
+    Announces the server on multiple network interfaces.
+
+    All announcements go through a single Zeroconf instance, that is bound
+    to all of the interfaces, instead of one instance (with its own sockets
+    and threads) per interface. Every interface gets its own service, that
+    carries only the address of this interface. The services are
+    (un)registered in parallel, as that takes some time.
+
+    The set of interfaces can be changed at any time using
+    update_interfaces(). The Zeroconf instance can not join the multicast
+    group on additional interfaces, so it is replaced by a new one whenever
+    the interfaces change. The services of unchanged interfaces are
+    registered again under their old names, so clients keep them.
+
+    Besides the server name, the TXT record of the services contains
+    the protocol version and the load of the server (number of players
+    and rooms, player capacity). The load is changed using set_load().
+    Changes are published at most once every `min_update_interval`
+    seconds, all changes in between are combined into a single update.
+    As zeroconf can not update the TXT record of a registered service,
+    an update unregisters and registers the services again, so clients
+    see them disappear and reappear (and resolve them again).
+    set_load() never waits for zeroconf, so it can be called from the
+    event loop of the server.
+    """
+
+    def __init__(self, server_name, port, capacity=0,
+                 min_update_interval=10):
+        self.server_name = server_name
+        self.port = port
+        # _lock protects the state and is only held briefly,
+        # _zeroconf_lock serialises the (slow) calls to zeroconf
+        self._lock = threading.Lock()
+        self._zeroconf_lock = threading.Lock()
+        self._zeroconf = None
+        self._registrations = dict()
+
+        # load information
+        self._load = dict(players=0, rooms=0, capacity=capacity)
+        self._min_update_interval = min_update_interval
+        self._last_update = 0
+        self._update_timer = None
+
+        # the InterfaceMonitor, that keeps the interfaces up to date
+        self.monitor = None
+
+    @property
+    def interfaces(self):
+        """
+        The interfaces, that are currently announced on.
+        (dict, mapping interface names to ipv4 addresses)
+        """
+        with self._lock:
+            return {iface: registration.address
+                    for iface, registration in self._registrations.items()}
+
+    def start(self, ifaces):
+        """
+        Starts announcing on the given interfaces.
+        :param ifaces: dict, mapping interface names to ipv4 addresses
+                       (as returned by get_interfaces())
+        """
+        self.update_interfaces(ifaces)
+        sockets = count_open_sockets()
+        _logger.info(
+            f"Announcing on {len(ifaces)} interface(s), "
+            f"using {threading.active_count()} threads and "
+            f"{'an unknown number of' if sockets is None else sockets} "
+            f"sockets.")
+
+    def stop(self):
+        """
+        Unregisters all services and closes the Zeroconf instance.
+        """
+        with self._lock:
+            if self._update_timer is not None:
+                self._update_timer.cancel()
+                self._update_timer = None
+        self.update_interfaces(dict())
+
+    def set_load(self, players=None, rooms=None, capacity=None):
+        """
+        Changes the announced load of the server.
+        Parameters, that are None, are left unchanged.
+        The change is published with a delay, if the last update
+        happened less than `min_update_interval` seconds ago.
+        """
+        with self._lock:
+            for key, value in (("players", players), ("rooms", rooms),
+                               ("capacity", capacity)):
+                if value is not None:
+                    self._load[key] = value
+
+            # an update is already scheduled and will include this change
+            if self._update_timer is not None:
+                return
+            delay = self._last_update + self._min_update_interval \
+                - time.monotonic()
+            self._update_timer = threading.Timer(
+                max(0, delay), self._publish_load)
+            self._update_timer.daemon = True
+            self._update_timer.start()
+
+    def _publish_load(self):
+        with self._zeroconf_lock:
+            with self._lock:
+                self._update_timer = None
+                self._last_update = time.monotonic()
+                registrations = dict(self._registrations)
+            if not registrations:
+                return
+
+            # zeroconf can not update a service, so all of them are
+            # registered again (in parallel, as that takes some time)
+            with ThreadPoolExecutor(max_workers=len(registrations)) as pool:
+                futures = {iface: pool.submit(self._republish, reg)
+                           for iface, reg in registrations.items()}
+            for iface, future in futures.items():
+                try:
+                    service = future.result()
+                except Exception:
+                    # forget the service, so that the interface
+                    # monitor announces the interface again
+                    _logger.exception(f"Updating the load on {iface} failed.")
+                    with self._lock:
+                        self._registrations.pop(iface, None)
+                    continue
+                with self._lock:
+                    self._registrations[iface] = \
+                        registrations[iface]._replace(service=service)
 
-def start_announcing_on_if(server_name, interface, address, port):
-    _logger.info(
-        f"Starting to announce server  named '{server_name}' "
-        f"via {interface} as {address}:{port}.")
-    service_uuid = uuid.uuid4()
-    service_type = "_cac._tcp.local."
-    service = ServiceInfo(service_type,
-                          f"Cards-Against-Cli-Server-"
-                          f"{service_uuid}.{service_type}",
-                          socket.inet_aton(address), port,
-                          properties=dict(name=server_name.encode("utf-8")))
-    zeroconf = Zeroconf(interfaces=[address])
-    zeroconf.register_service(service)
-    return zeroconf, service
+    def _republish(self, registration):
+        self._zeroconf.unregister_service(registration.service)
+        with self._lock:
+            service = self._make_service(
+                registration.address, registration.service.name)
+        # in case the old records are still cached, a new name is fine
+        self._zeroconf.register_service(service, allow_name_change=True)
+        return service
 
+    def update_interfaces(self, ifaces):
+        """
+        Changes the interfaces, that are announced on.
+        Returns the names of the removed and the added interfaces.
+        """
+        with self._zeroconf_lock:
+            current = self.interfaces
+            removed = [iface for iface, address in current.items()
+                       if ifaces.get(iface) != address]
+            added = {iface: address for iface, address in ifaces.items()
+                     if current.get(iface) != address}
+            if not removed and not added:
+                return [], []
 
-def stop_announcing_on_if(zeroconf, service, iface):
-    _logger.info(f"Unregistering service on {iface}...")
-    zeroconf.unregister_service(service)
-    zeroconf.close()
+            # say goodbye on the interfaces, that are gone
+            if removed:
+                self._unregister_all(removed)
 
+            # closing the old instance also unregisters the kept services,
+            # so they are registered again (by name) on the new one
+            with self._lock:
+                names = {iface: registration.service.name
+                         for iface, registration
+                         in self._registrations.items()}
+                self._registrations = dict()
+            if self._zeroconf is not None:
+                self._zeroconf.close()
+                self._zeroconf = None
+            if ifaces:
+                self._zeroconf = Zeroconf(interfaces=list(ifaces.values()))
+                self._register_all(ifaces, names)
+            return removed, list(added.keys())
 
-def stop_announcing(announcers):
-    for zeroconf, service, iface in announcers:
-        stop_announcing_on_if(zeroconf, service, iface)
+    def _register_all(self, ifaces, names):
+        # registering a service takes some time,
+        # so register all of them in parallel
+        with ThreadPoolExecutor(max_workers=len(ifaces)) as pool:
+            futures = {
+                iface: pool.submit(
+                    self._register, iface, address, names.get(iface))
+                for iface, address in ifaces.items()}
+        for iface, future in futures.items():
+            try:
+                service = future.result()
+            except Exception:
+                _logger.exception(f"Announcing on {iface} failed.")
+                continue
+            with self._lock:
+                self._registrations[iface] = _Registration(
+                    service, ifaces[iface])
 
+    def _unregister_all(self, ifaces):
+        with self._lock:
+            registrations = {iface: self._registrations.pop(iface)
+                             for iface in ifaces}
+        with ThreadPoolExecutor(max_workers=len(ifaces)) as pool:
+            futures = {iface: pool.submit(self._unregister, iface, reg)
+                       for iface, reg in registrations.items()}
+        for iface, future in futures.items():
+            try:
+                future.result()
+            except Exception:
+                _logger.exception(f"Unregistering on {iface} failed.")
 
-def start_announcing(server_name, port):
+    def _unregister(self, iface, registration):
+        _logger.info(f"Unregistering service on {iface}...")
+        self._zeroconf.unregister_service(registration.service)
+
+    def _register(self, iface, address, name=None):
+        """
+        Registers the service of an interface on the Zeroconf instance.
+        A new service name is generated, unless `name` is given.
+        """
+        if name is None:
+            _logger.info(
+                f"Starting to announce server  named '{self.server_name}' "
+                f"via {iface} as {address}:{self.port}.")
+            service_uuid = uuid.uuid4()
+            name = f"Cards-Against-Cli-Server-{service_uuid}.{SERVICE_TYPE}"
+        with self._lock:
+            service = self._make_service(address, name)
+        self._zeroconf.register_service(service)
+        return service
+
+    def _make_service(self, address, name):
+        # (called with _lock held, as it reads the load)
+        properties = dict(
+            name=self.server_name.encode("utf-8"),
+            proto=str(PROTOCOL_VERSION).encode("utf-8"),
+            players=str(self._load["players"]).encode("utf-8"),
+            rooms=str(self._load["rooms"]).encode("utf-8"),
+            capacity=str(self._load["capacity"]).encode("utf-8"),
+        )
+        return ServiceInfo(SERVICE_TYPE, name,
+                           socket.inet_aton(address), self.port,
+                           properties=properties)
+
+
+class InterfaceMonitor:
+    """
+    Watches the network interfaces and keeps the announcements up to date,
+    when interfaces come and go (e.g. when the wifi reconnects or a vpn
+    is started).
+
+    The interfaces are polled using netifaces every `interval` seconds,
+    which is cheap compared to the announcements themselves.
+    """
+
+    def __init__(self, announcer, interval=5):
+        self._announcer = announcer
+        self._interval = interval
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="cac-iface-monitor", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop_event.wait(self._interval):
+            # e.g. an interface disappears while it is being looked at,
+            # which is just the next poll's business
+            try:
+                self._poll()
+            except Exception:
+                _logger.exception("Updating the network interfaces failed.")
+
+    def _poll(self):
+        ifaces = get_interfaces()
+        if ifaces == self._announcer.interfaces:
+            return
+        removed, added = self._announcer.update_interfaces(ifaces)
+        _logger.info(
+            f"Network interfaces changed. "
+            f"Removed: {removed or 'none'}, added: {added or 'none'}.")
+
+
+def start_announcing(server_name, port, capacity=0):
     # announce on all interfaces
-    ifaces = get_interfaces()
-    result = []
-    for iface, addr in ifaces.items():
-        zeroconf, service = start_announcing_on_if(
-            server_name, iface, addr, port)
-        result.append((zeroconf, service, iface))
-    return result
+    announcer = Announcer(server_name, port, capacity)
+    announcer.start(get_interfaces())
+
+    # and keep an eye on them
+    interval = 5
+    if "CAC_INTERFACE_POLL_INTERVAL" in os.environ:
+        try:
+            interval = float(os.environ["CAC_INTERFACE_POLL_INTERVAL"])
+        except ValueError:
+            _logger.warning(
+                f"Invalid CAC_INTERFACE_POLL_INTERVAL, "
+                f"using {interval} seconds.")
+    if interval > 0:
+        announcer.monitor = InterfaceMonitor(announcer, interval)
+        announcer.monitor.start()
+    return announcer
+
+
+def stop_announcing(announcer):
+    if announcer.monitor is not None:
+        announcer.monitor.stop()
+    announcer.stop()
+
+
+def count_open_sockets():
+    """
+    Returns the number of sockets, that are open in this process.
+    Only works on linux, returns None elsewhere.
+    """
+    try:
+        fds = os.listdir("/proc/self/fd")
+    except OSError:
+        return None
+    count = 0
+    for fd in fds:
+        try:
+            if os.readlink(os.path.join("/proc/self/fd", fd)) \
+                    .startswith("socket:"):
+                count += 1
+        except OSError:
+            pass
+    return count
 
 
 def get_interfaces():
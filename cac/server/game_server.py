@@ -0,0 +1,558 @@
+"""
+The network part of the Cards Against Cli server.
+
+A single asyncio event loop serves all client connections. Every
+connection gets its own task, that reads from the socket. Writes are
+never awaited per message: outgoing data is handed to the transport
+right away and the sender only waits, once the transport buffer of
+the connection grows beyond a high-water mark.
+
+The messages are described in cac.protocol.wire. Changes of the rooms
+are not sent right away, but collected and sent as one delta per room
+every `tick` seconds. With a journal, the deltas of a tick are also
+written to disk together (see cac.server.journal).
+"""
+
+import asyncio
+import logging
+import os
+import signal
+import socket
+import time
+
+try:
+    import resource
+except ImportError:
+    # not available on windows
+    resource = None
+
+from cac.protocol import wire
+from cac.protocol.constants import PROTOCOL_VERSION
+from cac.server.rooms import RoomManager
+
+_logger = logging.getLogger(__name__)
+
+# how many bytes to read from a socket at once
+READ_SIZE = 64 * 1024
+
+# clients, that do not read their data, are disconnected, once this many
+# bytes are waiting to be sent to them
+MAX_WRITE_BUFFER = 4 * 1024 * 1024
+
+# file descriptors, that are kept free for everything besides the clients
+# (listening sockets, the journal, the card store, ...)
+RESERVED_FILE_DESCRIPTORS = 64
+
+
+def raise_open_file_limit():
+    """
+    Raises the soft limit of open files (RLIMIT_NOFILE) as far as allowed,
+    as every client needs a file descriptor.
+    Returns the new limit, None if it is unknown (e.g. on windows).
+    """
+    if resource is None:
+        return None
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    target = hard
+    if hard == resource.RLIM_INFINITY:
+        # macOS does not accept an infinite soft limit
+        target = max(soft, 1 << 16)
+    if soft != resource.RLIM_INFINITY and soft < target:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+            soft = target
+        except (ValueError, OSError) as e:
+            _logger.warning(f"Can not raise the limit of open files: {e}")
+    if soft == resource.RLIM_INFINITY:
+        return None
+    return soft
+
+
+class Connection:
+    """
+    A connected client.
+    """
+
+    def __init__(self, server, connection_id, reader, writer):
+        self.server = server
+        self.id = connection_id
+        self.peer = writer.get_extra_info("peername")
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self.messages_received = 0
+        self.messages_sent = 0
+
+        # set by the Hello message
+        self.player = connection_id
+        self.player_name = None
+
+        # the room, the player is in (or None)
+        self.room = None
+
+        self._reader = reader
+        self._writer = writer
+        self._decoder = wire.FrameDecoder()
+        self._closed = False
+
+        # messages, that are handed to another process with the connection
+        # (see hand_off())
+        self._unhandled = None
+
+    @property
+    def closed(self):
+        return self._closed
+
+    @property
+    def handoff_room(self):
+        """
+        The room, that the connection is handed off for (or None).
+        """
+        if self._unhandled is None:
+            return None
+        return self._unhandled[0].room
+
+    def send(self, data):
+        """
+        Queues data for sending. Never blocks.
+        Clients, that do not keep up with reading, are disconnected.
+        """
+        if self._closed:
+            return
+        transport = self._writer.transport
+        if transport.get_write_buffer_size() + len(data) > MAX_WRITE_BUFFER:
+            _logger.warning(
+                f"Connection {self.id} ({self.peer}) is too slow, "
+                f"disconnecting.")
+            self.close()
+            return
+        self._writer.write(data)
+        self.bytes_sent += len(data)
+        self.messages_sent += 1
+
+    async def drain(self):
+        """
+        Waits until the transport buffer drained below the high-water mark.
+        """
+        if not self._closed:
+            await self._writer.drain()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._writer.close()
+
+    def on_data(self, data):
+        """
+        Called for every chunk of data, that is received from the client.
+        """
+        try:
+            messages = self._decoder.feed(data)
+        except wire.ProtocolError as e:
+            self.send(wire.encode(
+                wire.Error(wire.ERROR_INVALID_MESSAGE, str(e))))
+            self.close()
+            return
+        self.messages_received += len(messages)
+        for index, message in enumerate(messages):
+            if self._closed:
+                break
+            self.server.handle_message(self, message)
+            if self._unhandled is not None:
+                self._unhandled.extend(messages[index + 1:])
+                break
+
+    def hand_off(self, message):
+        """
+        Stops handling the messages of the client, starting with the
+        given one. The server takes the connection away using detach(),
+        once run() returned.
+        """
+        self._unhandled = [message]
+
+    async def detach(self):
+        """
+        Stops serving the client, so that another process can take over
+        the connection. Returns a duplicate of the socket (file descriptor)
+        and the received data, that was not handled, yet.
+        """
+        transport = self._writer.transport
+        transport.pause_reading()
+
+        # everything sent so far has to reach the client first
+        while transport.get_write_buffer_size() and \
+                not transport.is_closing():
+            await asyncio.sleep(.01)
+
+        # collect all received data
+        self._reader.feed_eof()
+        received = await self._reader.read()
+        pending = b"".join(wire.encode(message)
+                           for message in self._unhandled) \
+            + self._decoder.take_pending() + received
+
+        fd = os.dup(transport.get_extra_info("socket").fileno())
+        self.close()
+        return fd, pending
+
+    async def run(self):
+        """
+        Reads from the client, until it disconnects
+        (or the connection is handed off).
+        """
+        while not self._closed and self._unhandled is None:
+            data = await self._reader.read(READ_SIZE)
+            if not data:
+                break
+            self.bytes_received += len(data)
+            self.on_data(data)
+
+
+class GameServer:
+    """
+    Accepts client connections and runs one task per connection.
+
+    `on_load_changed(players, rooms)` is called, whenever a player
+    joins (sends its Hello) or leaves the server or the number of rooms
+    changes (e.g. to update the announced load of the server).
+    At most `max_connections` players are served at once, further
+    clients get an Error as answer to their Hello. Connections, that did
+    not say Hello (yet), do not count as players, but are limited by the
+    number of open files, which start() raises as far as possible.
+
+    If the server is one of multiple worker processes, `shard` decides,
+    which rooms are hosted by this process. The connections of players,
+    that join other rooms, are handed to the responsible process.
+    (see cac.server.workers)
+
+    The black cards of all rooms are drawn from `black_cards`
+    (a CardTable, see cac.cards.deck).
+
+    If there is a `journal` (see cac.server.journal), the rooms are
+    recovered from it on start() and all changes are written to it.
+    Recovered players, that do not join again within `restore_timeout`
+    seconds (or until the server is stopped), are removed, and so are
+    the recovered rooms, that nobody joined.
+    """
+
+    def __init__(self, host, port, max_connections=1000, backlog=1024,
+                 server_name="", tick=.05, on_load_changed=None,
+                 shard=None, black_cards=None, journal=None,
+                 restore_timeout=300):
+        self.host = host
+        self.port = port
+        self.max_connections = max_connections
+        self.backlog = backlog
+        self.server_name = server_name
+        self.tick = tick
+        self.shard = shard
+        self.connections = dict()
+        # the number of connections, that said Hello
+        self.players = 0
+        self.journal = journal
+        self.restore_timeout = restore_timeout
+        self.rooms = RoomManager(black_cards, journal)
+        self._restore_deadline = None
+
+        # totals of the closed connections
+        # (see get_stats() for the totals of all connections)
+        self._closed_totals = [0, 0, 0, 0]
+
+        self._on_load_changed = on_load_changed
+        self._max_sockets = None
+        self._next_connection_id = 1
+        self._server = None
+        self._tick_task = None
+        self._tasks = set()
+
+    async def start(self):
+        limit = raise_open_file_limit()
+        if limit is not None:
+            self._max_sockets = max(1, limit - RESERVED_FILE_DESCRIPTORS)
+            if self.max_connections > self._max_sockets:
+                _logger.warning(
+                    f"Only {self._max_sockets} clients can be served, "
+                    f"as at most {limit} files can be open.")
+                self.max_connections = self._max_sockets
+        if self.journal is not None:
+            self._recover()
+        self._server = await asyncio.start_server(
+            self._handle_client,
+            host=self.host or None,
+            port=self.port,
+            backlog=self.backlog,
+            reuse_address=True,
+            reuse_port=self.shard is not None,
+            limit=READ_SIZE)
+        for sock in self._server.sockets:
+            _logger.info(f"Listening on {sock.getsockname()}.")
+        self._tick_task = asyncio.ensure_future(self._run_ticks())
+
+    async def stop(self):
+        """
+        Stops accepting new clients and disconnects the connected ones.
+        """
+        if self._server is not None:
+            self._server.close()
+        if self._tick_task is not None:
+            self._tick_task.cancel()
+            self._tick_task = None
+
+        # the rooms are kept for the players, that come back after
+        # the restart (leaving is not journaled anymore). the players,
+        # that did not come back since the last restart, are not.
+        if self.journal is not None:
+            self._expire_restored()
+            self.rooms.flush()
+            self._checkpoint()
+            self.journal.stop()
+            self.rooms.detach_journal()
+
+        for connection in list(self.connections.values()):
+            connection.close()
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._server is not None:
+            await self._server.wait_closed()
+            self._server = None
+
+    async def adopt(self, sock, player, player_name, pending):
+        """
+        Takes over a connection, that was handed off by another process.
+        :param sock: the socket of the connection
+        :param player: the player id (assigned by the other process)
+        :param player_name: the name of the player (from the Hello)
+        :param pending: received data, that was not handled, yet
+        """
+        reader, writer = await asyncio.open_connection(
+            sock=sock, limit=READ_SIZE)
+        await self._handle_client(
+            reader, writer, (player, player_name, pending))
+
+    async def _handle_client(self, reader, writer, adopted=None):
+
+        # out of file descriptors? (connections of other processes are
+        # always accepted, they already have one)
+        if adopted is None and self._max_sockets is not None and \
+                len(self.connections) >= self._max_sockets:
+            _logger.warning(
+                f"Rejecting {writer.get_extra_info('peername')}: "
+                f"{len(self.connections)} clients are connected already.")
+            writer.close()
+            return
+
+        # latency matters more than the number of packets
+        sock = writer.get_extra_info("socket")
+        if sock is not None and sock.family in (socket.AF_INET,
+                                                socket.AF_INET6):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        connection = Connection(self, self._new_connection_id(),
+                                reader, writer)
+        if self.shard is not None:
+            connection.player = self.shard.make_player_id(connection.id)
+        self.connections[connection.id] = connection
+        if adopted is not None:
+            # the client already got its Welcome from the other process
+            connection.player, connection.player_name, pending = adopted
+            self.players += 1
+            self._load_changed()
+            _logger.debug(
+                f"Client {connection.id} ({connection.player_name}) "
+                f"was handed over.")
+        task = asyncio.current_task()
+        self._tasks.add(task)
+
+        try:
+            if adopted is not None:
+                connection.on_data(pending)
+            await connection.run()
+            if connection.handoff_room is not None \
+                    and not connection.closed:
+                await self.shard.hand_off(connection)
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            _logger.debug(f"Client {connection.id}: {e}")
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            _logger.exception(f"Error in connection {connection.id}.")
+        finally:
+            connection.close()
+            self.rooms.leave(connection)
+            del self.connections[connection.id]
+            self._add_to_totals(connection)
+            self._tasks.discard(task)
+            if connection.player_name is not None:
+                self.players -= 1
+                self._load_changed()
+                _logger.debug(f"Client {connection.id} disconnected.")
+
+    def handle_message(self, connection, message):
+        """
+        Handles a single message of a client.
+        """
+        message_type = type(message)
+
+        # pings are answered before the Hello as well: the server list
+        # of the clients measures the latency this way, without joining
+        if message_type is wire.Ping:
+            connection.send(wire.encode(wire.Pong(message.timestamp)))
+            return
+
+        # the first message has to be the Hello
+        if connection.player_name is None:
+            if message_type is not wire.Hello:
+                self._send_error(connection, wire.ERROR_INVALID_MESSAGE,
+                                 "Expected Hello.")
+                connection.close()
+            elif message.protocol_version != PROTOCOL_VERSION:
+                self._send_error(
+                    connection, wire.ERROR_VERSION_MISMATCH,
+                    f"The server speaks protocol version {PROTOCOL_VERSION}.")
+                connection.close()
+            elif self.players >= self.max_connections:
+                self._send_error(
+                    connection, wire.ERROR_SERVER_FULL,
+                    f"{self.max_connections} players are playing already.")
+                connection.close()
+            else:
+                # names are sent in string lists, which can not
+                # contain zero bytes
+                connection.player_name = message.player_name.replace(
+                    "\0", "")
+                connection.send(wire.encode(
+                    wire.Welcome(connection.player, self.server_name)))
+                self.players += 1
+                self._load_changed()
+                _logger.debug(
+                    f"Client {connection.id} joined as "
+                    f"{connection.player_name} ({connection.peer}).")
+            return
+
+        if message_type is wire.JoinRoom:
+            if self.shard is not None and \
+                    not self.shard.owns(message.room):
+                connection.hand_off(message)
+                return
+            self.rooms.join(connection, message.room)
+            self._load_changed()
+        elif message_type is wire.LeaveRoom:
+            self.rooms.leave(connection)
+            self._load_changed()
+        elif message_type is wire.RequestStats:
+            connection.send(wire.encode(self.get_stats()))
+        elif message_type in (wire.PlayCard, wire.Vote,
+                              wire.RequestSnapshot):
+            room = connection.room
+            if room is None:
+                self._send_error(connection, wire.ERROR_NOT_IN_ROOM,
+                                 "Join a room first.")
+            elif message_type is wire.PlayCard:
+                room.play_card(connection, message.card)
+                self.rooms.mark_dirty(room)
+            elif message_type is wire.Vote:
+                room.vote(connection, message.player)
+                self.rooms.mark_dirty(room)
+            else:
+                room.send_snapshot(connection)
+        else:
+            self._send_error(connection, wire.ERROR_INVALID_MESSAGE,
+                             f"Unexpected {message_type.__name__}.")
+
+    def get_stats(self):
+        """
+        Returns the load statistics as Stats message.
+        """
+        messages_in, messages_out, bytes_in, bytes_out = self._closed_totals
+        for connection in self.connections.values():
+            messages_in += connection.messages_received
+            messages_out += connection.messages_sent
+            bytes_in += connection.bytes_received
+            bytes_out += connection.bytes_sent
+        return wire.Stats(self.players, len(self.rooms.rooms),
+                          messages_in, messages_out, bytes_in, bytes_out)
+
+    def _recover(self):
+        states = self.journal.recover()
+        self.rooms.restore(states)
+        self.journal.start(list(states.values()))
+        if states:
+            self._restore_deadline = time.monotonic() + self.restore_timeout
+
+        # new players must not get the ids of the recovered ones
+        # (the ids of the connections grow with the player ids)
+        for state in states.values():
+            for player in state.players:
+                self._next_connection_id = max(
+                    self._next_connection_id, player + 1)
+
+    def _expire_restored(self):
+        if self._restore_deadline is None:
+            return
+        self._restore_deadline = None
+        self.rooms.expire_restored()
+        self._load_changed()
+
+    def _checkpoint(self):
+        self.journal.checkpoint(
+            [room.state for room in self.rooms.rooms.values()])
+
+    async def _run_ticks(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            if self._restore_deadline is not None and \
+                    time.monotonic() >= self._restore_deadline:
+                self._expire_restored()
+            self.rooms.flush()
+            if self.journal is not None:
+                self.journal.sync()
+                if self.journal.checkpoint_due:
+                    self._checkpoint()
+
+    def _new_connection_id(self):
+        connection_id = self._next_connection_id
+        self._next_connection_id += 1
+        return connection_id
+
+    def _send_error(self, connection, code, text):
+        connection.send(wire.encode(wire.Error(code, text)))
+
+    def _add_to_totals(self, connection):
+        totals = self._closed_totals
+        totals[0] += connection.messages_received
+        totals[1] += connection.messages_sent
+        totals[2] += connection.bytes_received
+        totals[3] += connection.bytes_sent
+
+    def _load_changed(self):
+        if self._on_load_changed is not None:
+            self._on_load_changed(self.players, len(self.rooms.rooms))
+
+
+async def serve(server, stop_event):
+    """
+    Runs the server until the stop event is set.
+    """
+    await server.start()
+    try:
+        await stop_event.wait()
+    finally:
+        await server.stop()
+
+
+async def run_server(server):
+
+    # stop on ctrl+c and on kill
+    stop_event = asyncio.Event()
+    loop = asyncio.get_event_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            # not supported on windows, ctrl+c still raises
+            # a KeyboardInterrupt there.
+            pass
+
+    await serve(server, stop_event)
@@ -0,0 +1,336 @@
+"""
+Keeps the state of the rooms on disk, so that the games survive
+a restart (or crash) of the server.
+
+Every change of a room (the RoomDelta, that is sent to the players) is
+appended to a journal. The journal is split into segments. Whenever
+a segment is full, a checkpoint is written: a snapshot of every room,
+after which all older segments and checkpoints are deleted. On
+startup, the latest checkpoint is loaded and only the segments after
+it are replayed, so the time to recover depends on the size of
+a segment, not on how long the server has been running.
+
+Writing and fsync-ing happens on a background thread. All records,
+that were appended since the last sync, are written with a single
+fsync (once per tick of the server), so a crash loses at most the
+changes of the last few ticks.
+
+Files in the state directory:
+
+    journal-<n>.log     segment n: records of
+                        crc32 (uint32), payload length (uint32),
+                        kind (uint8), length of the room name (uint16),
+                        followed by the room name and the payload
+                        (a RoomDelta frame, or nothing if the room
+                        was removed)
+    checkpoint-<n>.snap RoomSnapshot frames of all rooms at the start
+                        of segment n
+"""
+
+import logging
+import os
+import queue
+import re
+import struct
+import threading
+import zlib
+
+from cac.protocol import wire
+from cac.protocol.room_state import RoomState, SequenceGap
+
+_logger = logging.getLogger(__name__)
+
+_CRC = struct.Struct("<I")
+_RECORD_HEADER = struct.Struct("<IBH")
+_RECORD_DELTA = 1
+_RECORD_REMOVED = 2
+
+_SEGMENT_FILE = re.compile(r"^journal-(\d+)\.log$")
+_CHECKPOINT_FILE = re.compile(r"^checkpoint-(\d+)\.snap$")
+
+
+def _segment_path(directory, number):
+    return os.path.join(directory, f"journal-{number:08d}.log")
+
+
+def _checkpoint_path(directory, number):
+    return os.path.join(directory, f"checkpoint-{number:08d}.snap")
+
+
+def _encode_record(kind, room, payload=b""):
+    name = room.encode("utf-8")
+    body = _RECORD_HEADER.pack(len(payload), kind, len(name)) \
+        + name + payload
+    return _CRC.pack(zlib.crc32(body)) + body
+
+
+def _iter_records(data):
+    """
+    Yields the (kind, room, payload) of the records in a segment.
+    Stops at the first incomplete or damaged record (e.g. the last
+    one, if the server crashed while writing it).
+    """
+    header_size = _CRC.size + _RECORD_HEADER.size
+    offset = 0
+    while offset < len(data):
+        end = offset + header_size
+        if end <= len(data):
+            crc, = _CRC.unpack_from(data, offset)
+            length, kind, name_length = \
+                _RECORD_HEADER.unpack_from(data, offset + _CRC.size)
+            end += name_length + length
+        if end > len(data) or \
+                zlib.crc32(data[offset + _CRC.size:end]) != crc:
+            _logger.warning(
+                f"Ignoring a damaged journal record at byte {offset}.")
+            return
+        name_start = offset + header_size
+        room = bytes(data[name_start:name_start + name_length]) \
+            .decode("utf-8")
+        yield kind, room, data[name_start + name_length:end]
+        offset = end
+
+
+def _fsync_directory(directory):
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return  # not possible on every platform
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class Journal:
+    """
+    The journal of the room changes in `directory`.
+
+    Call recover() first, to get the rooms of the last run.
+    A new segment is started, once the current one is larger than
+    `segment_size` bytes (see checkpoint_due and checkpoint()).
+    """
+
+    def __init__(self, directory, segment_size=16 * 1024 * 1024):
+        self.directory = directory
+        self.segment_size = segment_size
+        self._segment = 0
+        self._segment_bytes = 0
+        self._pending = []
+        self._queue = queue.Queue()
+        self._thread = None
+        self._file = None
+
+    @property
+    def checkpoint_due(self):
+        return self._segment_bytes >= self.segment_size
+
+    def recover(self):
+        """
+        Loads the latest checkpoint and replays the journal.
+        Returns a dict, that maps room names to RoomStates.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        segments, checkpoints = self._list_files()
+
+        # the latest checkpoint, that can be read
+        states = dict()
+        start = 0
+        for number in sorted(checkpoints, reverse=True):
+            try:
+                states = self._load_checkpoint(number)
+            except (OSError, wire.ProtocolError) as e:
+                _logger.warning(f"Ignoring checkpoint {number}: {e}")
+                continue
+            start = number
+            break
+
+        # replay the newer segments
+        replayed = 0
+        for number in sorted(segments):
+            if number < start:
+                continue
+            with open(_segment_path(self.directory, number), "rb") as f:
+                data = f.read()
+            for kind, room, payload in _iter_records(data):
+                replayed += 1
+                if kind == _RECORD_REMOVED:
+                    states.pop(room, None)
+                    continue
+                state = states.get(room)
+                if state is None:
+                    state = states[room] = RoomState(room)
+                try:
+                    state.apply_delta(wire.decode(payload))
+                except (SequenceGap, wire.ProtocolError) as e:
+                    _logger.warning(f"Skipping a change of room {room}: {e}")
+
+        self._segment = max([start, *segments, *checkpoints])
+        _logger.info(
+            f"Recovered {len(states)} rooms from checkpoint {start} "
+            f"and {replayed} journal records.")
+        return states
+
+    def start(self, states):
+        """
+        Starts a new segment, beginning with a checkpoint
+        of the given (recovered) RoomStates.
+        The checkpoint is written right away, so that an unusable state
+        directory raises an OSError here (and not on the writer thread).
+        """
+        self._segment += 1
+        self._segment_bytes = 0
+        self._write_checkpoint_files(
+            self._segment, self._encode_snapshots(states))
+        self._thread = threading.Thread(
+            target=self._run, name="cac-journal", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Writes everything, that is pending, and stops the writer thread.
+        """
+        if self._thread is None:
+            return
+        self.sync()
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def append_delta(self, room, delta):
+        record = _encode_record(_RECORD_DELTA, room, wire.encode(delta))
+        self._pending.append(record)
+        self._segment_bytes += len(record)
+
+    def append_removed(self, room):
+        record = _encode_record(_RECORD_REMOVED, room)
+        self._pending.append(record)
+        self._segment_bytes += len(record)
+
+    def sync(self):
+        """
+        Hands the records, that were appended since the last call,
+        to the writer thread, which writes them with a single fsync.
+        """
+        if self._pending:
+            self._queue.put(("write", b"".join(self._pending)))
+            self._pending = []
+
+    def checkpoint(self, states):
+        """
+        Starts a new segment. The given RoomStates (all rooms, with all
+        changes appended to the journal) are written as checkpoint,
+        older segments are deleted.
+        """
+        self.sync()
+        self._segment += 1
+        self._segment_bytes = 0
+        self._queue.put(
+            ("checkpoint", (self._segment, self._encode_snapshots(states))))
+
+    def _encode_snapshots(self, states):
+        return b"".join(wire.encode(state.snapshot()) for state in states)
+
+    def _list_files(self):
+        segments = []
+        checkpoints = []
+        for filename in os.listdir(self.directory):
+            match = _SEGMENT_FILE.match(filename)
+            if match:
+                segments.append(int(match.group(1)))
+            match = _CHECKPOINT_FILE.match(filename)
+            if match:
+                checkpoints.append(int(match.group(1)))
+        return segments, checkpoints
+
+    def _load_checkpoint(self, number):
+        with open(_checkpoint_path(self.directory, number), "rb") as f:
+            data = f.read()
+        decoder = wire.FrameDecoder()
+        states = dict()
+        for snapshot in decoder.feed(data):
+            states[snapshot.room] = RoomState.from_snapshot(snapshot)
+        if decoder.take_pending():
+            raise wire.ProtocolError("Truncated checkpoint.")
+        return states
+
+    def _run(self):
+        running = True
+        while running:
+            # everything, that queued up while the last fsync was running
+            tasks = [self._queue.get()]
+            while True:
+                try:
+                    tasks.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            # consecutive writes share a single fsync
+            writes = []
+            for task in tasks:
+                if task is not None and task[0] == "write":
+                    writes.append(task[1])
+                    continue
+                self._write(writes)
+                writes = []
+                if task is None:
+                    running = False
+                    break
+                self._write_checkpoint(*task[1])
+            self._write(writes)
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write(self, chunks):
+        if not chunks:
+            return
+        if self._file is None:
+            _logger.error("Dropping journal records: there is no segment.")
+            return
+        try:
+            self._file.write(b"".join(chunks))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except Exception:
+            # the thread has to keep going, or the queue grows forever
+            _logger.exception("Writing the journal failed.")
+
+    def _write_checkpoint(self, number, snapshots):
+        try:
+            self._write_checkpoint_files(number, snapshots)
+        except Exception:
+            # (the records go to the previous segment meanwhile)
+            _logger.exception(f"Writing checkpoint {number} failed.")
+
+    def _write_checkpoint_files(self, number, snapshots):
+        # the new segment and the checkpoint have to exist both, before
+        # the journal continues in the new segment. if anything fails,
+        # it continues in the old one.
+        segment_path = _segment_path(self.directory, number)
+        new_file = open(segment_path, "ab")
+        try:
+            path = _checkpoint_path(self.directory, number)
+            with open(path + ".tmp", "wb") as f:
+                f.write(snapshots)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(path + ".tmp", path)
+            _fsync_directory(self.directory)
+        except BaseException:
+            new_file.close()
+            os.unlink(segment_path)
+            raise
+        if self._file is not None:
+            self._file.close()
+        self._file = new_file
+
+        # everything older is not needed anymore
+        segments, checkpoints = self._list_files()
+        for old in segments:
+            if old < number:
+                os.unlink(_segment_path(self.directory, old))
+        for old in checkpoints:
+            if old < number:
+                os.unlink(_checkpoint_path(self.directory, old))
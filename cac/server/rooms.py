@@ -0,0 +1,216 @@
+"""
+The game rooms of the server.
+"""
+
+import random
+
+from cac.cards.deck import Deck
+from cac.protocol import wire
+from cac.protocol.room_state import RoomState
+
+
+class Room:
+    """
+    A room with its players.
+    Changes of the state are sent to all members by flush().
+
+    The black cards are drawn from a Deck for the given CardTable
+    (random card ids are used, if there is no table).
+
+    If the room has a `journal` (see cac.server.journal),
+    every delta is appended to it.
+    """
+
+    def __init__(self, name, black_cards=None, journal=None):
+        self.name = name
+        self.state = RoomState(name)
+        self.journal = journal
+        # player id -> connection
+        self.members = dict()
+        self.black_deck = None
+        if black_cards is not None and len(black_cards) > 0:
+            self.black_deck = Deck(len(black_cards))
+        # whether the current black card was drawn from black_deck
+        self._holds_black_card = False
+
+    def restore(self, state):
+        """
+        Continues with a recovered RoomState.
+        """
+        self.state = state
+        self._holds_black_card = False
+
+    def join(self, connection):
+        state = self.state
+
+        # players of a recovered room get their score back on rejoining
+        score = 0
+        for player, (name, old_score) in list(state.players.items()):
+            if name == connection.player_name and \
+                    player not in self.members:
+                state.remove_player(player)
+                score = old_score
+                break
+
+        state.add_player(connection.player, connection.player_name)
+        if score:
+            state.set_score(connection.player, score)
+        if state.czar not in self.members:
+            state.set_czar(connection.player)
+        if state.round == 0:
+            state.new_round(self._draw_black_card())
+
+        # the new member gets the complete state,
+        # the others get the change with the next delta
+        self.flush()
+        self.members[connection.player] = connection
+        connection.send(wire.encode(self.state.snapshot()))
+
+    def leave(self, connection):
+        self.members.pop(connection.player, None)
+        self.state.remove_player(connection.player)
+        if self.state.czar == connection.player and self.members:
+            self.state.set_czar(next(iter(self.members)))
+
+    def play_card(self, connection, card):
+        if connection.player == self.state.czar:
+            return
+        self.state.play_card(connection.player, card)
+
+    def vote(self, connection, player):
+        """
+        The czar picks the winning card of the round.
+        """
+        state = self.state
+        if connection.player != state.czar or player not in state.played:
+            return
+        state.set_score(player, state.players[player][1] + 1)
+
+        # next round, with the next czar
+        players = list(self.members)
+        if players:
+            index = players.index(state.czar) \
+                if state.czar in players else -1
+            state.set_czar(players[(index + 1) % len(players)])
+        state.new_round(self._draw_black_card())
+
+    def send_snapshot(self, connection):
+        self.flush()
+        connection.send(wire.encode(self.state.snapshot()))
+
+    def flush(self):
+        """
+        Sends the changes since the last flush to all members.
+        The delta is encoded only once for all of them.
+        """
+        delta = self.state.take_delta()
+        if delta is None:
+            return 0
+        if self.journal is not None:
+            self.journal.append_delta(self.name, delta)
+        frame = wire.encode(delta)
+        for connection in self.members.values():
+            connection.send(frame)
+        return len(self.members)
+
+    def _draw_black_card(self):
+        if self.black_deck is None:
+            return random.randrange(1, 1 << 16)
+        if self._holds_black_card:
+            self.black_deck.discard(self.state.black_card)
+        card = self.black_deck.draw()
+        self._holds_black_card = card is not None
+        return card
+
+
+class RoomManager:
+    """
+    Creates rooms on demand and removes them, once they are empty.
+    All rooms share the table of black cards.
+    """
+
+    def __init__(self, black_cards=None, journal=None):
+        self.black_cards = black_cards
+        self.journal = journal
+        self.rooms = dict()
+        self._dirty = set()
+        self._restored = []
+
+    def restore(self, states):
+        """
+        Recreates the rooms from RoomStates (e.g. recovered from the
+        journal). They wait for their players to join again,
+        until expire_restored() is called.
+        """
+        for name, state in states.items():
+            room = self.rooms[name] = Room(
+                name, self.black_cards, self.journal)
+            room.restore(state)
+            self._restored.append(room)
+
+    def expire_restored(self):
+        """
+        Removes the restored players, that did not join again,
+        and the restored rooms, that nobody joined.
+        """
+        for room in self._restored:
+            if self.rooms.get(room.name) is not room:
+                continue
+            for player in list(room.state.players):
+                if player not in room.members:
+                    room.state.remove_player(player)
+            if room.members:
+                self._dirty.add(room)
+            else:
+                self._remove(room)
+        self._restored = []
+
+    def join(self, connection, name):
+        if connection.room is not None:
+            self.leave(connection)
+        room = self.rooms.get(name)
+        if room is None:
+            room = self.rooms[name] = Room(
+                name, self.black_cards, self.journal)
+        connection.room = room
+        room.join(connection)
+
+    def leave(self, connection):
+        room = connection.room
+        if room is None:
+            return
+        connection.room = None
+        room.leave(connection)
+        if room.members:
+            self._dirty.add(room)
+        else:
+            self._remove(room)
+
+    def _remove(self, room):
+        del self.rooms[room.name]
+        self._dirty.discard(room)
+        if self.journal is not None:
+            self.journal.append_removed(room.name)
+
+    def mark_dirty(self, room):
+        self._dirty.add(room)
+
+    def flush(self):
+        """
+        Sends the pending changes of all rooms.
+        Returns the number of sent messages.
+        """
+        sent = 0
+        dirty, self._dirty = self._dirty, set()
+        for room in dirty:
+            sent += room.flush()
+        return sent
+
+    def detach_journal(self):
+        """
+        Stops journaling (e.g. on shutdown, so that the rooms
+        of the disconnected players are kept).
+        """
+        self.journal = None
+        for room in self.rooms.values():
+            room.journal = None
@@ -1,5 +1,9 @@
 from cac.server.announcement import start_announcing, stop_announcing
-from time import sleep
+from cac.server.game_server import GameServer, run_server
+from cac.server.journal import Journal
+from cac.protocol.constants import DEFAULT_PORT
+from cac.cards.store import CardStore
+import asyncio
 import logging
 import os
 
@@ -14,6 +18,45 @@ CAC_ANNOUNCE_INTERFACES
 CAC_ANNOUNCE_SERVER_NAME
             Human readable server name as shown by the client.
             Default value: "My Cards against Cli Server"
+CAC_MAX_PLAYERS
+            The number of players, that the server can handle.
+            Further players are rejected after their Hello.
+            It is announced to the clients together with the current load.
+            Default value: 1000
+CAC_LISTEN_ADDRESS
+            The address, that the server listens on.
+            By default, the server listens on all addresses.
+CAC_PORT
+            The TCP port, that the server listens on (and announces).
+            Default value: 9852
+CAC_LISTEN_BACKLOG
+            How many connections may wait to be accepted.
+            Default value: 1024
+CAC_CARDS
+            Path of a card store (see cac.cards.store), that the black
+            cards are drawn from. The file is memory-mapped, so all
+            workers share it. By default, random card ids are used.
+CAC_ANNOUNCE
+            Set to 0 to not announce the server in the local network
+            (e.g. for load tests). Default value: 1
+CAC_WORKERS
+            Number of worker processes. With more than one worker,
+            the rooms are spread over the workers (see cac.server.workers).
+            CAC_MAX_PLAYERS is split evenly between them.
+            Default value: 1
+CAC_STATE_DIR
+            Directory, that the rooms are journaled to, so that they
+            survive a restart or crash of the server
+            (see cac.server.journal). Every worker uses its own
+            subdirectory. By default, the rooms are only kept in memory.
+CAC_JOURNAL_SEGMENT_SIZE
+            Bytes of journal, after which a checkpoint of all rooms is
+            written. Smaller values make the recovery faster, but
+            checkpoints more frequent. Default value: 16777216 (16 MiB)
+CAC_RESTORE_TIMEOUT
+            Seconds, that the players of recovered rooms have to join
+            again. Afterwards, they are removed (and so are the rooms,
+            that nobody joined). Default value: 300
 """
 
 
@@ -28,20 +71,63 @@ def main():
         level=logging.DEBUG
     )
 
-    # start announcing zeroconf service
+    # configuration
     server_name = "My Cards against Cli Server"
     if "CAC_ANNOUNCE_SERVER_NAME" in os.environ:
         server_name = os.environ["CAC_ANNOUNCE_SERVER_NAME"]
-    announcers = start_announcing(server_name, 9852)
+    capacity = int(os.environ.get("CAC_MAX_PLAYERS", 1000))
+    host = os.environ.get("CAC_LISTEN_ADDRESS", "")
+    port = int(os.environ.get("CAC_PORT", DEFAULT_PORT))
+    backlog = int(os.environ.get("CAC_LISTEN_BACKLOG", 1024))
+    workers = int(os.environ.get("CAC_WORKERS", 1))
+    cards_path = os.environ.get("CAC_CARDS")
+    state_dir = os.environ.get("CAC_STATE_DIR")
+    segment_size = int(os.environ.get("CAC_JOURNAL_SEGMENT_SIZE",
+                                      16 * 1024 * 1024))
+    restore_timeout = float(os.environ.get("CAC_RESTORE_TIMEOUT", 300))
+
+    # start announcing zeroconf service
+    announcer = None
+    if os.environ.get("CAC_ANNOUNCE", "1") != "0":
+        announcer = start_announcing(server_name, port, capacity)
+
+    def on_load_changed(players, rooms):
+        if announcer is not None:
+            announcer.set_load(players=players, rooms=rooms)
 
     # run the actual server
     try:
-        while True:
-            sleep(0.1)
+        if workers > 1:
+            from cac.server.workers import Supervisor
+            supervisor = Supervisor(
+                workers, host, port,
+                max_connections=capacity,
+                backlog=backlog,
+                server_name=server_name,
+                cards_path=cards_path,
+                state_dir=state_dir,
+                segment_size=segment_size,
+                restore_timeout=restore_timeout,
+                on_load_changed=on_load_changed)
+            supervisor.run()
+        else:
+            cards = CardStore(cards_path) if cards_path else None
+            journal = Journal(state_dir, segment_size) if state_dir else None
+            server = GameServer(
+                host, port,
+                max_connections=capacity,
+                backlog=backlog,
+                server_name=server_name,
+                on_load_changed=on_load_changed,
+                black_cards=cards.black_cards() if cards else None,
+                journal=journal,
+                restore_timeout=restore_timeout)
+            asyncio.run(run_server(server))
     except KeyboardInterrupt:
         pass
-
-    stop_announcing(announcers)
+    finally:
+        if announcer is not None:
+            stop_announcing(announcer)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,362 @@
+"""
+Runs the server in multiple worker processes.
+
+All workers listen on the same port (SO_REUSEPORT), so the kernel
+spreads the incoming connections over them. Every room belongs to
+exactly one worker: crc32(room name) % number of workers. When a player
+joins a room of another worker, the connection is handed to that
+worker: the socket is sent over a unix socket (SCM_RIGHTS), together
+with the data, that was received but not handled, yet. The client does
+not notice the move.
+
+The supervisor (the main process) starts the workers, restarts them,
+when they crash, and collects their Stats, which the workers send
+every second.
+
+Only available on systems with SO_REUSEPORT and unix sockets
+(e.g. linux, macOS).
+"""
+
+import array
+import asyncio
+import logging
+import multiprocessing
+import os
+import select
+import signal
+import socket
+import struct
+import time
+import zlib
+
+from cac.cards.store import CardStore
+from cac.protocol import wire
+from cac.server.game_server import GameServer, run_server
+from cac.server.journal import Journal
+
+_logger = logging.getLogger(__name__)
+
+# handed off connections: player (uint32), length of the name (uint16),
+# followed by the name and the pending data.
+_HANDOFF_HEADER = struct.Struct("!IH")
+_MAX_HANDOFF_SIZE = 128 * 1024
+
+# stats of the workers: index of the worker (uint8), followed by a Stats
+_STATS_HEADER = struct.Struct("!B")
+
+
+def get_shard(room, shards):
+    """
+    Returns the index of the worker, that hosts the given room.
+    """
+    return zlib.crc32(room.encode("utf-8")) % shards
+
+
+def send_fd(sock, fd, data):
+    sock.sendmsg([data], [(socket.SOL_SOCKET, socket.SCM_RIGHTS,
+                           array.array("i", [fd]))])
+
+
+def recv_fd(sock, size):
+    """
+    Receives data and a file descriptor, as sent by send_fd().
+    Returns the data and the file descriptor (or None).
+    """
+    fds = array.array("i")
+    data, ancdata, flags, address = sock.recvmsg(
+        size, socket.CMSG_LEN(fds.itemsize))
+    for level, kind, cdata in ancdata:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            fds.frombytes(cdata[:len(cdata) - len(cdata) % fds.itemsize])
+    return data, fds[0] if fds else None
+
+
+class Shard:
+    """
+    The part of the rooms, that a single worker is responsible for.
+
+    `handoff_sockets` contains one unix datagram socket per worker, that
+    connections are sent to. The worker receives its own connections
+    on `inbox`.
+    """
+
+    def __init__(self, index, count, handoff_sockets, inbox):
+        self.index = index
+        self.count = count
+        self._handoff_sockets = handoff_sockets
+        self._inbox = inbox
+        self._server = None
+
+    def owns(self, room):
+        return get_shard(room, self.count) == self.index
+
+    def make_player_id(self, connection_id):
+        # player ids are unique over all workers
+        return connection_id * self.count + self.index
+
+    def start(self, server):
+        """
+        Starts receiving connections from the other workers.
+        """
+        self._server = server
+        self._inbox.setblocking(False)
+
+        # sending must never block the event loop
+        for handoff_socket in self._handoff_sockets:
+            handoff_socket.setblocking(False)
+        asyncio.get_event_loop().add_reader(
+            self._inbox.fileno(), self._receive)
+
+    def stop(self):
+        asyncio.get_event_loop().remove_reader(self._inbox.fileno())
+
+    async def hand_off(self, connection):
+        """
+        Sends a connection to the worker, that is responsible
+        for the room, that the player wants to join.
+        """
+        room = connection.handoff_room
+        target = get_shard(room, self.count)
+        fd, pending = await connection.detach()
+        try:
+            name = connection.player_name.encode("utf-8")
+            data = _HANDOFF_HEADER.pack(connection.player, len(name)) \
+                + name + pending
+            if len(data) > _MAX_HANDOFF_SIZE:
+                _logger.warning(
+                    f"Dropping player {connection.player}: "
+                    f"too much pending data to hand it off.")
+                return
+            try:
+                send_fd(self._handoff_sockets[target], fd, data)
+            except OSError as e:
+                _logger.warning(
+                    f"Dropping player {connection.player}: "
+                    f"could not hand it off to worker {target} ({e}).")
+                return
+            _logger.debug(
+                f"Handed player {connection.player} off to worker {target} "
+                f"(room '{room}').")
+        finally:
+            socket.close(fd)
+
+    def _receive(self):
+        while True:
+            try:
+                data, fd = recv_fd(self._inbox, _MAX_HANDOFF_SIZE)
+            except BlockingIOError:
+                return
+            if fd is None:
+                continue
+            player, name_length = _HANDOFF_HEADER.unpack_from(data)
+            offset = _HANDOFF_HEADER.size
+            name = data[offset:offset + name_length].decode("utf-8")
+            pending = data[offset + name_length:]
+            sock = socket.socket(fileno=fd)
+            asyncio.ensure_future(
+                self._server.adopt(sock, player, name, pending))
+
+
+async def _send_stats(server, index, stats_socket, interval):
+    while True:
+        data = _STATS_HEADER.pack(index) + wire.encode(server.get_stats())
+        try:
+            stats_socket.send(data)
+        except OSError:
+            pass
+        await asyncio.sleep(interval)
+
+
+async def _run_worker_async(server, shard, index, stats_socket):
+    stats_socket.setblocking(False)
+    shard.start(server)
+    stats_task = asyncio.ensure_future(
+        _send_stats(server, index, stats_socket, 1))
+    try:
+        await run_server(server)
+    finally:
+        stats_task.cancel()
+        shard.stop()
+
+
+def run_worker(index, count, config, handoff_sockets, inbox, stats_socket):
+    """
+    Entry point of the worker processes.
+    """
+    logging.basicConfig(
+        format=f'%(levelname)s - worker {index} - %(name)s - %(message)s',
+        level=config["log_level"]
+    )
+    shard = Shard(index, count, handoff_sockets, inbox)
+
+    # all workers map the same file, so the cards are in memory only once
+    cards = None
+    if config["cards_path"]:
+        cards = CardStore(config["cards_path"]).black_cards()
+
+    # a restarted worker recovers the rooms of its predecessor
+    journal = None
+    if config["state_dir"]:
+        journal = Journal(
+            os.path.join(config["state_dir"], f"worker-{index}"),
+            config["segment_size"])
+
+    server = GameServer(
+        config["host"], config["port"],
+        max_connections=config["max_connections"],
+        backlog=config["backlog"],
+        server_name=config["server_name"],
+        shard=shard,
+        black_cards=cards,
+        journal=journal,
+        restore_timeout=config["restore_timeout"])
+    try:
+        asyncio.run(_run_worker_async(server, shard, index, stats_socket))
+    except KeyboardInterrupt:
+        pass
+
+
+class Supervisor:
+    """
+    Starts `count` worker processes and keeps them running.
+
+    `on_load_changed(players, rooms)` is called with the totals
+    of all workers, whenever they change.
+    """
+
+    def __init__(self, count, host, port, max_connections=1000,
+                 backlog=1024, server_name="", cards_path=None,
+                 state_dir=None, segment_size=16 * 1024 * 1024,
+                 restore_timeout=300, on_load_changed=None, restart_delay=1):
+        self.count = count
+        self.restart_delay = restart_delay
+        self._config = dict(
+            host=host, port=port,
+            max_connections=max(1, max_connections // count),
+            backlog=backlog, server_name=server_name, cards_path=cards_path,
+            state_dir=state_dir, segment_size=segment_size,
+            restore_timeout=restore_timeout,
+            log_level=logging.getLogger().level)
+        self._on_load_changed = on_load_changed
+
+        # spawn instead of fork: the supervisor runs threads
+        # (e.g. for the announcement)
+        self._context = multiprocessing.get_context("spawn")
+
+        # one inbox per worker, for handed off connections
+        self._inboxes = []
+        self._handoff_sockets = []
+        for i in range(count):
+            inbox, handoff = socket.socketpair(
+                socket.AF_UNIX, socket.SOCK_DGRAM)
+            self._inboxes.append(inbox)
+            self._handoff_sockets.append(handoff)
+
+        # stats of all workers
+        self._stats_inbox, self._stats_socket = socket.socketpair(
+            socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._stats = dict()
+        self._load = None
+
+        self._processes = [None] * count
+        self._started_at = [0] * count
+        self._running = False
+
+    def get_stats(self):
+        """
+        Returns the sum of the last Stats of all workers.
+        """
+        totals = [0] * len(wire.Stats._fields)
+        for stats in self._stats.values():
+            for i, value in enumerate(stats):
+                totals[i] += value
+        return wire.Stats(*totals)
+
+    def run(self):
+        """
+        Runs the workers until SIGINT or SIGTERM is received.
+        """
+        self._running = True
+
+        def stop(signum, frame):
+            self._running = False
+
+        previous_handlers = {
+            sig: signal.signal(sig, stop)
+            for sig in (signal.SIGINT, signal.SIGTERM)}
+        try:
+            for index in range(self.count):
+                self._start_worker(index)
+            while self._running:
+                self._receive_stats(timeout=.5)
+                self._restart_crashed_workers()
+        finally:
+            for sig, handler in previous_handlers.items():
+                signal.signal(sig, handler)
+            self._stop_workers()
+
+    def _start_worker(self, index):
+        process = self._context.Process(
+            target=run_worker,
+            name=f"cac-worker-{index}",
+            args=(index, self.count, self._config, self._handoff_sockets,
+                  self._inboxes[index], self._stats_socket),
+            daemon=True)
+        process.start()
+        self._processes[index] = process
+        self._started_at[index] = time.monotonic()
+        _logger.info(f"Started worker {index} (pid {process.pid}).")
+
+    def _restart_crashed_workers(self):
+        for index, process in enumerate(self._processes):
+            if not self._running:
+                return
+            if process.is_alive():
+                continue
+
+            # do not restart workers, that crash right away, all the time
+            if time.monotonic() - self._started_at[index] \
+                    < self.restart_delay:
+                continue
+            _logger.warning(
+                f"Worker {index} died (exit code {process.exitcode}), "
+                f"restarting it.")
+            self._stats.pop(index, None)
+            self._start_worker(index)
+
+    def _stop_workers(self):
+        for process in self._processes:
+            if process is not None and process.is_alive():
+                process.terminate()
+        for process in self._processes:
+            if process is None:
+                continue
+            process.join(5)
+            if process.is_alive():
+                process.kill()
+                process.join()
+
+    def _receive_stats(self, timeout):
+        readable, _, _ = select.select([self._stats_inbox], [], [], timeout)
+        if not readable:
+            return
+        self._stats_inbox.setblocking(False)
+        while True:
+            try:
+                data = self._stats_inbox.recv(4096)
+            except (BlockingIOError, InterruptedError):
+                break
+            index, = _STATS_HEADER.unpack_from(data)
+            try:
+                stats = wire.decode(data[_STATS_HEADER.size:])
+            except wire.ProtocolError:
+                continue
+            self._stats[index] = stats
+
+        # publish the new load
+        stats = self.get_stats()
+        load = stats.players, stats.rooms
+        if load != self._load:
+            self._load = load
+            if self._on_load_changed is not None:
+                self._on_load_changed(*load)